@@ -1,18 +1,12 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 import joblib
 import pickle
 st.title("Insurance Analytics Dashboard")
-# Load models
-severity_model = joblib.load("notebooks/saved_models/xgboost_severity_model.pkl")
-premium_model = joblib.load("notebooks/saved_models/randomforest_best_model.pkl")
-with open("notebooks/saved_models/xgb_claim_occurred_model.pkl", "rb") as f:
-    claim_model = pickle.load(f)
-with open("notebooks/saved_models/scaler.pkl", "rb") as f:
-    scaler = pickle.load(f)
-# Section 1: Claim Severity Prediction
-st.header("1️ Claim Severity Prediction")
+
+# Feature lists the form sections (and batch scoring) feed each model, in training order
 severity_features = [
     "RecordID", "UnderwrittenCoverID", "PolicyID", "PostalCode", "mmcode",
     "RegistrationYear", "Cylinders", "cubiccapacity", "kilowatts",
@@ -20,6 +14,91 @@ severity_features = [
     "CalculatedPremiumPerTerm", "TotalPremium", "TransactionYear",
     "VehicleAge", "ClaimRatio"
 ]
+premium_features = [
+    "RecordID", "UnderwrittenCoverID", "PolicyID", "PostalCode", "mmcode",
+    "RegistrationYear", "Cylinders", "cubiccapacity", "kilowatts",
+    "NumberOfDoors", "CapitalOutstanding", "SumInsured", "TotalPremium"
+]
+claim_features = [
+    "RecordID", "UnderwrittenCoverID", "PolicyID", "PostalCode", "mmcode",
+    "RegistrationYear", "Cylinders", "cubiccapacity", "kilowatts",
+    "NumberOfDoors", "CapitalOutstanding", "SumInsured", "TotalPremium"
+]
+
+# Load models
+MODEL_ARTIFACTS = {
+    "severity": ("notebooks/saved_models/xgboost_severity_model.pkl", "joblib"),
+    "premium": ("notebooks/saved_models/randomforest_best_model.pkl", "joblib"),
+    "claim": ("notebooks/saved_models/xgb_claim_occurred_model.pkl", "pickle"),
+    "scaler": ("notebooks/saved_models/scaler.pkl", "pickle"),
+}
+MODEL_FEATURES = {
+    "severity": severity_features,
+    "premium": premium_features,
+    "claim": claim_features,
+    "scaler": claim_features,
+}
+BATCH_CHUNK_ROWS = 50_000
+
+def load_artifact(path, loader):
+    if loader == "pickle":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    return joblib.load(path)
+
+def model_feature_names(model):
+    """Feature names recorded at fit time (sklearn ``feature_names_in_`` or the XGBoost booster), if any."""
+    names = getattr(model, "feature_names_in_", None)
+    if names is None and hasattr(model, "get_booster"):
+        names = model.get_booster().feature_names
+    return None if names is None else list(names)
+
+def validate_features(model, expected):
+    """Return a list of problems between the model's fitted features and ``expected`` (empty if they match)."""
+    fitted = model_feature_names(model)
+    if fitted is None:
+        return []
+    problems = []
+    missing = [f for f in fitted if f not in expected]
+    unused = [f for f in expected if f not in fitted]
+    if missing:
+        problems.append(f"model expects features not in the list: {missing}")
+    if unused:
+        problems.append(f"list has features the model was not fitted on: {unused}")
+    if not problems and fitted != list(expected):
+        problems.append("feature order differs from training; inputs are reordered to match the model")
+    return problems
+
+def artifact_mtimes():
+    return tuple(os.path.getmtime(path) for path, _ in MODEL_ARTIFACTS.values())
+
+@st.cache_resource(show_spinner="Loading models...", max_entries=1)
+def load_model_registry(mtimes):
+    # Cached per process; ``mtimes`` is part of the cache key so replaced artifacts are reloaded, and
+    # max_entries=1 evicts the previous set instead of keeping every old copy in memory
+    models = {name: load_artifact(path, loader) for name, (path, loader) in MODEL_ARTIFACTS.items()}
+    issues = {name: validate_features(models[name], MODEL_FEATURES[name]) for name in models}
+    return models, issues
+
+def model_columns(name):
+    # Column order the model was fitted with, falling back to the dashboard's list
+    model = models["scaler" if name == "claim" else name]
+    return model_feature_names(model) or MODEL_FEATURES[name]
+
+def model_input(name, df):
+    return df[model_columns(name)]
+
+models, feature_issues = load_model_registry(artifact_mtimes())
+severity_model = models["severity"]
+premium_model = models["premium"]
+claim_model = models["claim"]
+scaler = models["scaler"]
+for name, problems in feature_issues.items():
+    for problem in problems:
+        st.sidebar.warning(f"{name}: {problem}")
+
+# Section 1: Claim Severity Prediction
+st.header("1️ Claim Severity Prediction")
 severity_input = {}
 for feat in severity_features:
     if feat in ["RecordID", "UnderwrittenCoverID", "PolicyID", "PostalCode", "mmcode"]:
@@ -29,7 +108,7 @@ for feat in severity_features:
 
 if st.button("Predict Claim Severity"):
     try:
-        X_severity = pd.DataFrame([severity_input])
+        X_severity = model_input("severity", pd.DataFrame([severity_input]))
         pred = severity_model.predict(X_severity)[0]
         st.success(f"Predicted Claim Severity: ${pred:,.2f}")
     except Exception as e:
@@ -38,11 +117,6 @@ if st.button("Predict Claim Severity"):
 # Section 2: Premium Price Prediction
 st.header("2️ Premium Price Prediction")
 
-premium_features = [
-    "RecordID", "UnderwrittenCoverID", "PolicyID", "PostalCode", "mmcode",
-    "RegistrationYear", "Cylinders", "cubiccapacity", "kilowatts",
-    "NumberOfDoors", "CapitalOutstanding", "SumInsured", "TotalPremium"
-]
 premium_input = {}
 for feat in premium_features:
     if feat in ["RecordID", "UnderwrittenCoverID", "PolicyID", "PostalCode", "mmcode"]:
@@ -52,7 +126,7 @@ for feat in premium_features:
 
 if st.button("Predict Premium Price"):
     try:
-        X_premium = pd.DataFrame([premium_input])
+        X_premium = model_input("premium", pd.DataFrame([premium_input]))
         pred = premium_model.predict(X_premium)[0]
         st.success(f"Predicted Premium Price: ${pred:,.2f}")
     except Exception as e:
@@ -60,11 +134,6 @@ if st.button("Predict Premium Price"):
 
 # Section 3: Claim Occurrence Prediction 
 st.header("3️ Claim Occurrence Prediction")
-claim_features = [
-    "RecordID", "UnderwrittenCoverID", "PolicyID", "PostalCode", "mmcode",
-    "RegistrationYear", "Cylinders", "cubiccapacity", "kilowatts",
-    "NumberOfDoors", "CapitalOutstanding", "SumInsured", "TotalPremium"
-]
 claim_input = {}
 for feat in claim_features:
     # Integer features
@@ -75,7 +144,7 @@ for feat in claim_features:
         claim_input[feat] = st.number_input(f"{feat}", value=0.0, key="claim_"+feat)
 if st.button("Predict Claim Occurrence Probability"):
     try:
-        X_claim = pd.DataFrame([claim_input])
+        X_claim = model_input("claim", pd.DataFrame([claim_input]))
         X_claim_scaled = scaler.transform(X_claim)
         proba = claim_model.predict_proba(X_claim_scaled)[0][1]
         pred_class = claim_model.predict(X_claim_scaled)[0]
@@ -83,3 +152,66 @@ if st.button("Predict Claim Occurrence Probability"):
         st.info(f"Predicted Probability of Claim Occurrence: {proba:.2%}")
     except Exception as e:
         st.error(f"Prediction error: {e}")
+
+# Section 4: Batch Scoring
+st.header("4️ Batch Scoring")
+
+def score_batch(df, progress):
+    """Score every row with each model whose fitted columns are present, one vectorized call per model per chunk.
+
+    Returns the scored frame and ``{model: reason}`` for models that were skipped; a model that fails
+    is skipped on its own and the others are still scored.
+    """
+    out = df.copy()
+    skipped = {}
+    for name in ["severity", "premium", "claim"]:
+        missing = [f for f in model_columns(name) if f not in df.columns]
+        if missing:
+            skipped[name] = f"missing columns: {missing}"
+    tasks = [name for name in ["severity", "premium", "claim"] if name not in skipped]
+    n = len(df)
+    results = {name: np.empty(n) for name in tasks}
+    claim_class = np.empty(n, dtype=int) if "claim" in tasks else None
+    n_steps = max(len(tasks) * ((n + BATCH_CHUNK_ROWS - 1) // BATCH_CHUNK_ROWS), 1)
+    step = 0
+    for name in tasks:
+        try:
+            for start in range(0, n, BATCH_CHUNK_ROWS):
+                stop = min(start + BATCH_CHUNK_ROWS, n)
+                X = model_input(name, df.iloc[start:stop])
+                if name == "claim":
+                    X_scaled = scaler.transform(X)
+                    results[name][start:stop] = claim_model.predict_proba(X_scaled)[:, 1]
+                    claim_class[start:stop] = claim_model.predict(X_scaled)
+                elif name == "severity":
+                    results[name][start:stop] = severity_model.predict(X)
+                else:
+                    results[name][start:stop] = premium_model.predict(X)
+                step += 1
+                progress.progress(step / n_steps, text=f"Scoring {name}: {stop:,}/{n:,} rows")
+        except Exception as e:
+            skipped[name] = f"scoring failed: {e}"
+            del results[name]
+    if "severity" in results:
+        out["PredictedClaimSeverity"] = results["severity"]
+    if "premium" in results:
+        out["PredictedPremium"] = results["premium"]
+    if "claim" in results:
+        out["ClaimProbability"] = results["claim"]
+        out["PredictedClaimOccurred"] = claim_class
+    return out, skipped
+
+batch_file = st.file_uploader("Upload a CSV of policies to score with all three models", type="csv")
+if batch_file is not None and st.button("Score Uploaded CSV"):
+    try:
+        batch_df = pd.read_csv(batch_file)
+        progress = st.progress(0.0, text="Scoring...")
+        scored, skipped = score_batch(batch_df, progress)
+        for name, reason in skipped.items():
+            st.warning(f"Skipped {name} model; {reason}")
+        st.success(f"Scored {len(scored):,} rows")
+        st.dataframe(scored.head(100))
+        st.download_button("Download predictions", scored.to_csv(index=False).encode("utf-8"),
+                           file_name="batch_predictions.csv", mime="text/csv")
+    except Exception as e:
+        st.error(f"Batch scoring error: {e}")
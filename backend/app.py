@@ -1,11 +1,23 @@
+import os
+import sys
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 import joblib
 import logging
+import threading
 from scipy.sparse import hstack, csr_matrix
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.model_config import (MODEL_PATHS, ID_COLS, CLAIM_DROP_COLS, SEVERITY_DROP_COLS, SEVERITY_TARGET,
+                                  PREMIUM_DROP_COLS)
+from backend.running_stats import DatasetSummary
+from backend.prediction_cache import PredictionCache, deep_sizeof, model_inputs, model_keys
+from backend.explanations import (BACKGROUND_PATH, ExplanationQueueFull, ExplanationService, ModelExplainer,
+                                  load_background)
+from backend.geo_risk import GEO_RISK_DIR, VALUE_COLS as GEO_RISK_COLS, load_index
+
 # ----------------------
 # Logging setup
 # ----------------------
@@ -20,17 +32,28 @@ CORS(app)
 # ----------------------
 # Load models
 # ----------------------
-claim_model = joblib.load("models/logisticregression_claim_model.pkl")
-claim_scaler = joblib.load("models/scaler_claim.pkl")
-claim_ohe = joblib.load("models/ohe_claim.pkl")
+claim_model = joblib.load(MODEL_PATHS["claim_model"])
+claim_scaler = joblib.load(MODEL_PATHS["claim_scaler"])
+claim_ohe = joblib.load(MODEL_PATHS["claim_ohe"])
+
+severity_model = joblib.load(MODEL_PATHS["severity_model"])
+premium_model = joblib.load(MODEL_PATHS["premium_model"])
+MODEL_INPUTS = model_inputs({"claim": claim_model, "severity": severity_model, "premium": premium_model})
+
+# Precomputed geographic risk factors (None until `python -m backend.geo_risk` has built them);
+# reloaded whenever the index is rebuilt
+geo_risk_index = load_index(GEO_RISK_DIR)
 
-severity_model = joblib.load("models/random_forest_severity_model.pkl")
-premium_model = joblib.load("models/randomforest_premium_model_fast.pkl")
+def current_geo_risk_index():
+    global geo_risk_index
+    geo_risk_index = load_index(GEO_RISK_DIR, geo_risk_index, quiet=True)
+    return geo_risk_index
 
 # ----------------------
-# Store uploaded CSV globally for pagination
+# Store uploaded CSV globally for pagination, with its whole-file EDA summary
 # ----------------------
 uploaded_df = None
+uploaded_eda_preview = None
 
 # ----------------------
 # Preprocessing functions
@@ -40,9 +63,7 @@ CAT_COLS_CLAIM = None
 
 def preprocess_claim_data(df):
     global NUM_COLS_CLAIM, CAT_COLS_CLAIM
-    drop_cols = ["RecordID","UnderwrittenCoverID","PolicyID","TransactionMonth","VehicleIntroDate",
-                 "CalculatedPremiumPerTerm","TotalPremium","SumInsured","CapitalOutstanding"]
-    df = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
+    df = df.drop(columns=[c for c in CLAIM_DROP_COLS if c in df.columns], errors='ignore')
 
     if NUM_COLS_CLAIM is None:
         NUM_COLS_CLAIM = df.select_dtypes(include=[np.number]).columns.tolist()
@@ -82,18 +103,12 @@ def preprocess_claim_data(df):
     return X_scaled
 
 def preprocess_severity_data(df):
-    drop_cols = ["RecordID","UnderwrittenCoverID","PolicyID","TransactionMonth","Title","Bank",
-                 "AccountType","Gender","Country","Province","PostalCode","MainCrestaZone",
-                 "SubCrestaZone","ItemType","mmcode","VehicleType","make","Model","bodytype",
-                 "VehicleIntroDate","AlarmImmobiliser","TrackingDevice","CapitalOutstanding",
-                 "SumInsured","TotalPremium"]
-    df = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
-    X = df.drop(columns=["TotalClaims"], errors='ignore')
+    df = df.drop(columns=[c for c in SEVERITY_DROP_COLS if c in df.columns], errors='ignore')
+    X = df.drop(columns=[SEVERITY_TARGET], errors='ignore')
     return X.fillna(0)
 
 def preprocess_premium_data(df):
-    drop_cols = ["RecordID","UnderwrittenCoverID","PolicyID","TransactionMonth"]
-    X = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
+    X = df.drop(columns=[c for c in PREMIUM_DROP_COLS if c in df.columns], errors='ignore')
     return X.fillna(0)
 
 # ----------------------
@@ -112,31 +127,82 @@ def make_predictions(df_chunk):
     premium_X = preprocess_premium_data(df_chunk)
     premium_preds = premium_model.predict(premium_X)
 
-    df_res = df_chunk[["RecordID","UnderwrittenCoverID","PolicyID","TransactionMonth"]].copy()
+    df_res = df_chunk[ID_COLS].copy()
     df_res["ClaimProbability"] = claim_preds
     df_res["ClaimSeverity"] = severity_preds
     df_res["PremiumPrediction"] = premium_preds
 
+    index = current_geo_risk_index()
+    if index is not None:
+        df_res["GeoRiskFactor"] = index.lookup_frame(df_chunk)["risk_factor"].to_numpy()
+
     return df_res.replace({np.nan: None}).to_dict(orient="records")
 
-def get_eda_preview(df_chunk):
-    numeric_stats = df_chunk.describe().replace({np.nan: None}).to_dict()
-    cat_cols = df_chunk.select_dtypes(include=['object','bool','category']).columns.tolist()
-    cat_summary = {}
-    for col in cat_cols:
-        top = df_chunk[col].value_counts().head(5)
-        cat_summary[col] = top.to_dict()
+def get_eda_preview(df):
+    # Exact counts/means/std/min/max/quantiles and heavy-hitter categories over every row
+    return DatasetSummary.from_frame(df).to_eda_preview()
+
+# ----------------------
+# Explanations
+# ----------------------
+def pipeline_explainer(name, model, preprocess):
+    cols = list(model.feature_names_in_)
+    if hasattr(model, "steps"):
+        transformer, estimator = model[:-1], model[-1]
+        return ModelExplainer(
+            name, estimator,
+            transform=lambda df: transformer.transform(preprocess(df).reindex(columns=cols, fill_value=0)),
+            feature_names=lambda: (transformer.get_feature_names_out(), cols),
+        )
+    return ModelExplainer(name, model, transform=lambda df: preprocess(df).reindex(columns=cols, fill_value=0),
+                          feature_names=lambda: (cols, cols))
+
+def build_explainers():
     return {
-        "numeric_summary": numeric_stats,
-        "top_categories": cat_summary
+        "claim": ModelExplainer(
+            "claim", claim_model, transform=preprocess_claim_data,
+            feature_names=lambda: (NUM_COLS_CLAIM + list(claim_ohe.get_feature_names_out()),
+                                   NUM_COLS_CLAIM + CAT_COLS_CLAIM),
+            classifier=True,
+        ),
+        "severity": pipeline_explainer("severity", severity_model, preprocess_severity_data),
+        "premium": pipeline_explainer("premium", premium_model, preprocess_premium_data),
     }
 
+# Built on first use, so processes that only score with these models (the ASGI pool workers import this
+# module) don't start the explanation threads or hold its cache
+explanation_service = None
+explanation_service_lock = threading.Lock()
+
+def get_explanation_service():
+    global explanation_service
+    with explanation_service_lock:
+        if explanation_service is None:
+            explanation_service = ExplanationService(
+                build_explainers(),
+                cache=PredictionCache(
+                    max_entries=int(os.environ.get("EXPLAIN_CACHE_ENTRIES", 20_000)),
+                    max_bytes=int(os.environ.get("EXPLAIN_CACHE_MB", 64)) * 1024 * 1024,
+                    ttl=float(os.environ.get("EXPLAIN_CACHE_TTL_S", 3600)),
+                    artifact_paths=list(MODEL_PATHS.values()) + [BACKGROUND_PATH],
+                    # Each entry is a dict of per-feature contributions, far bigger than its shallow size
+                    size_fn=deep_sizeof,
+                ),
+                key_fn=lambda name, row: model_keys(row, {name: MODEL_INPUTS[name]}, prefix="explain:")[name],
+                background=load_background(),
+                batch_size=int(os.environ.get("EXPLAIN_BATCH_SIZE", 64)),
+                max_workers=int(os.environ.get("EXPLAIN_WORKERS", 2)),
+                budget_s=float(os.environ.get("EXPLAIN_BUDGET_MS", 2000)) / 1000,
+                max_pending=int(os.environ.get("EXPLAIN_MAX_PENDING_BATCHES", 64)),
+            )
+    return explanation_service
+
 # ----------------------
 # Routes
 # ----------------------
 @app.route("/api/predict_csv", methods=["POST"])
 def predict_csv():
-    global uploaded_df
+    global uploaded_df, uploaded_eda_preview
     try:
         if 'file' not in request.files:
             return jsonify({"error":"No file part"}), 400
@@ -149,10 +215,11 @@ def predict_csv():
         uploaded_df = df  # store globally
 
         preview_chunk = df.head(10)
-        eda_chunk = df.sample(1000) if len(df) > 1000 else df.copy()
-
         predictions = make_predictions(preview_chunk)
-        eda_preview = get_eda_preview(eda_chunk)
+
+        # Summarise the whole file once at upload; every page reuses it
+        eda_preview = get_eda_preview(df)
+        uploaded_eda_preview = eda_preview
 
         return jsonify({
             "total_rows": len(df),
@@ -178,11 +245,10 @@ def get_chunk():
         end = start + 10
         chunk = uploaded_df.iloc[start:end]
         predictions = make_predictions(chunk)
-        eda_preview = get_eda_preview(chunk)
 
         return jsonify({
             "rows": predictions,
-            "eda_preview": eda_preview,
+            "eda_preview": uploaded_eda_preview,
             "page": page
         })
 
@@ -190,6 +256,76 @@ def get_chunk():
         logging.error(f"Chunk error: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+def positive_param(data, name, integer=False):
+    """``data[name]`` if it is a positive number (an int with ``integer``), None if absent; ValueError otherwise."""
+    value = data.get(name)
+    if value is None:
+        return None
+    kinds = int if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds) or not np.isfinite(value) or value <= 0:
+        raise ValueError(f"'{name}' must be a positive {'integer' if integer else 'number'}")
+    return value
+
+# 202: rows still computing, retry for them; 207: some rows failed while others are still computing
+EXPLAIN_STATUS_CODES = {"complete": 200, "error": 200, "pending": 202, "partial": 207}
+
+@app.route("/api/explain", methods=["POST"])
+def explain():
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Send {'row': {...}} or {'rows': [...]}"}), 400
+        if "rows" in data:
+            rows = data["rows"]
+        elif "row" in data:
+            rows = [data["row"]]
+        else:
+            return jsonify({"error": "Send {'row': {...}} or {'rows': [...]}"}), 400
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            return jsonify({"error": "'row' must be an object and 'rows' a list of objects"}), 400
+        budget_ms = positive_param(data, "budget_ms")
+        result = get_explanation_service().explain(
+            rows,
+            models=data.get("models"),
+            top_n=positive_param(data, "top_n", integer=True),
+            budget_s=budget_ms / 1000 if budget_ms is not None else None,
+        )
+        return jsonify(result), EXPLAIN_STATUS_CODES[result["status"]]
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ExplanationQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logging.error(f"Explanation error: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/explain/global", methods=["GET"])
+def explain_global():
+    top_n = request.args.get("top_n", type=int)
+    return jsonify(get_explanation_service().global_importance(top_n))
+
+@app.route("/api/geo_risk", methods=["GET", "POST"])
+def geo_risk():
+    try:
+        index = current_geo_risk_index()
+        if index is None:
+            return jsonify({"error": "Geographic risk index not built"}), 503
+        if request.method == "GET":
+            # Single lookup, e.g. /api/geo_risk?PostalCode=2000&Province=gauteng
+            return jsonify(index.lookup(**request.args.to_dict()))
+
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get("rows"), list):
+            return jsonify({"error": "Send {'rows': [{'PostalCode': ..., 'Province': ...}, ...]}"}), 400
+        result = index.lookup_frame(pd.DataFrame(data["rows"]))
+        return jsonify({"rows": result.to_dict(orient="records"), "columns": GEO_RISK_COLS + ["level"],
+                        "months": index.manifest.get("months", [])})
+
+    except Exception as e:
+        logging.error(f"Geo risk error: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/")
 def index():
     return "Insurance Risk Analytics API is running."
@@ -0,0 +1,531 @@
+"""
+ASGI serving mode for the prediction API.
+
+Serves the endpoints of ``backend/app.py`` except ``/api/explain`` (plus ``/api/predict_row`` from
+``backend/eda/app.py``) on an event loop. Explanations stay Flask-only: their retry-and-reuse cache lives
+in one process, and per-worker copies would not see each other's finished rows. Uploads, streaming responses and job polling stay on the loop; CSV parsing,
+preprocessing and model inference run in a bounded process pool whose workers load the models once
+at start-up. An uploaded CSV is parsed once, by one worker, into an uncompressed Arrow (Feather) file
+that every worker memory-maps to score a page; the loop only keeps its path and shape. Background jobs
+write their predictions to an NDJSON file that is streamed from disk. When the pool is saturated new
+scoring requests are rejected with 503 instead of queueing, and each request is bounded by a timeout
+(504), so cheap requests such as ``/`` stay fast while large files are being scored.
+
+Run from the repository root (the workers load ``models/*.pkl`` relative to it):
+    uvicorn backend.asgi:app --host 0.0.0.0 --port 5000
+
+Repeated ``/api/predict_row`` quotes are served from an in-process prediction cache (see
+``backend/prediction_cache.py``) without dispatching to the pool. Every scoring route checks the model
+files first; when they changed on disk the cache is dropped and the pool is restarted so workers pick up
+the new artifacts, and results computed by the old workers are not cached.
+
+Configuration (environment variables):
+    SCORING_WORKERS        process pool size (default: CPU count)
+    MAX_PENDING_SCORING    max scoring tasks queued or running before returning 503 (default: 2 x workers)
+    REQUEST_TIMEOUT_S      timeout for interactive scoring requests (default: 30)
+    INGEST_TIMEOUT_S       timeout for parsing and summarising an upload in /api/predict_csv (default: 600)
+    JOB_TIMEOUT_S          timeout for background scoring jobs (default: 3600)
+    PREDICTION_CACHE_ENTRIES / PREDICTION_CACHE_MB / PREDICTION_CACHE_TTL_S   prediction cache bounds
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from backend.geo_risk import GEO_RISK_DIR, VALUE_COLS as GEO_RISK_COLS, load_index
+from backend.model_config import MODEL_PATHS
+from backend.prediction_cache import PredictionCache, model_inputs, model_keys
+
+# ----------------------
+# Logging setup
+# ----------------------
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+# ----------------------
+# Config
+# ----------------------
+SCORING_WORKERS = int(os.environ.get("SCORING_WORKERS", os.cpu_count() or 1))
+MAX_PENDING_SCORING = int(os.environ.get("MAX_PENDING_SCORING", 2 * SCORING_WORKERS))
+REQUEST_TIMEOUT_S = float(os.environ.get("REQUEST_TIMEOUT_S", 30))
+INGEST_TIMEOUT_S = float(os.environ.get("INGEST_TIMEOUT_S", 600))
+JOB_TIMEOUT_S = float(os.environ.get("JOB_TIMEOUT_S", 3600))
+PAGE_SIZE = 10
+UPLOAD_READ_BYTES = 1 << 20
+RESULT_STREAM_BYTES = 1 << 20
+MAX_JOBS = 100
+
+
+# ----------------------
+# Worker-side functions (run inside the process pool)
+# ----------------------
+_scoring = None
+
+
+def _init_worker():
+    # backend/app.py loads all model artifacts at import time; do it once per worker
+    global _scoring
+    import backend.app as scoring
+    _scoring = scoring
+
+
+def _ping():
+    return os.getpid()
+
+
+def _model_inputs():
+    return model_inputs({"claim": _scoring.claim_model, "severity": _scoring.severity_model,
+                         "premium": _scoring.premium_model})
+
+
+def _write_table(df, path):
+    # Arrow needs one type per column; read_csv can leave numbers and strings mixed in an object column
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    # Uncompressed so readers can memory-map it and touch only the rows of a page
+    df.to_feather(path, compression="uncompressed")
+
+
+def _ingest_upload(csv_path, table_path):
+    df = pd.read_csv(csv_path)
+    logging.info(f"Uploaded CSV columns: {df.columns.tolist()}")
+    _write_table(df, table_path)
+    # Only the shape goes back to the event loop, not the DataFrame
+    return df.shape, _scoring.make_predictions(df.head(PAGE_SIZE)), _scoring.get_eda_preview(df)
+
+
+def _score_page(table_path, start):
+    # Memory-mapped: workers share the OS page cache instead of each holding a parsed copy
+    table = feather.read_table(table_path, memory_map=True)
+    return _scoring.make_predictions(table.slice(start, PAGE_SIZE).to_pandas())
+
+
+def _predict_row(data, models):
+    row_data = pd.DataFrame([data])
+    preds = {}
+    if "claim" in models:
+        claim_X = _scoring.preprocess_claim_data(row_data)
+        preds["claim"] = float(_scoring.claim_model.predict_proba(claim_X)[:, 1][0])
+    if "severity" in models:
+        severity_X = _scoring.preprocess_severity_data(row_data)
+        preds["severity"] = float(_scoring.severity_model.predict(severity_X)[0])
+    if "premium" in models:
+        premium_X = _scoring.preprocess_premium_data(row_data)
+        preds["premium"] = float(_scoring.premium_model.predict(premium_X)[0])
+    return preds
+
+
+def _score_file(path, out_path, chunksize=50_000):
+    # Predictions go straight to disk as NDJSON; only the row count is sent back
+    n_rows = 0
+    with open(out_path, "w") as out:
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            rows = _scoring.make_predictions(chunk)
+            out.write("".join(json.dumps(r, default=_json_default) + "\n" for r in rows))
+            n_rows += len(rows)
+    return n_rows
+
+
+# ----------------------
+# Bounded scoring pool
+# ----------------------
+class PoolSaturated(Exception):
+    pass
+
+
+class ScoringPool:
+    """Process pool with admission control: at most ``max_pending`` tasks queued or running."""
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.executor = None
+
+    async def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        # Touch every worker so model loading happens now rather than on the first request
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*[loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)])
+        logging.info(f"Scoring pool ready: {len(set(pids))} workers, max_pending={self.max_pending}")
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def restart(self):
+        # New workers load the current artifacts; in-flight tasks finish on the old ones
+        old, self.executor = self.executor, ProcessPoolExecutor(max_workers=self.workers,
+                                                                initializer=_init_worker)
+        if old is not None:
+            old.shutdown(wait=False)
+        logging.info("Scoring pool restarted")
+
+    async def run(self, timeout, fn, *args):
+        if self.pending >= self.max_pending:
+            raise PoolSaturated()
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        cf = self.executor.submit(fn, *args)
+        # Release the slot when the worker is actually done, not when the caller stops waiting
+        cf.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cf), timeout)
+        except asyncio.TimeoutError:
+            cf.cancel()  # only succeeds if the task has not started yet
+            raise
+
+    def _release(self):
+        self.pending -= 1
+
+    def stats(self):
+        return {"workers": self.workers, "pending": self.pending, "max_pending": self.max_pending}
+
+
+pool = ScoringPool(SCORING_WORKERS, MAX_PENDING_SCORING)
+
+# Input columns of each model, fetched from a worker (the models only live there) and used to build
+# the same cache keys as backend/eda/app.py; refetched after the workers reload the models
+model_input_cols = None
+
+
+def reload_models():
+    global model_input_cols
+    pool.restart()
+    model_input_cols = None
+
+
+# Repeated single-policy quotes are answered from here without touching the pool
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get("PREDICTION_CACHE_ENTRIES", 100_000)),
+    max_bytes=int(os.environ.get("PREDICTION_CACHE_MB", 64)) * 1024 * 1024,
+    ttl=float(os.environ.get("PREDICTION_CACHE_TTL_S", 3600)),
+    artifact_paths=MODEL_PATHS.values(),
+    on_artifacts_changed=reload_models,
+)
+
+# Geographic risk lookups are binary searches over memory-mapped arrays, cheap enough to answer on
+# the loop; reloaded whenever the index is rebuilt
+geo_risk_index = load_index(GEO_RISK_DIR)
+
+
+def current_geo_risk_index():
+    global geo_risk_index
+    geo_risk_index = load_index(GEO_RISK_DIR, geo_risk_index, quiet=True)
+    return geo_risk_index
+
+# ----------------------
+# Store uploaded CSV and background jobs
+# ----------------------
+uploaded = None  # {"path", "rows", "columns"} of the current upload's Arrow file
+uploaded_eda_preview = None
+jobs = {}
+# Files a timed-out worker may still write after the request gave up on them; removed at shutdown
+abandoned_files = set()
+
+
+def _remove_file(path):
+    with contextlib.suppress(OSError):
+        os.remove(path)
+
+
+async def save_upload(request):
+    """Stream the multipart ``file`` field to a temp file; returns (path, error_response)."""
+    form = await request.form()
+    upload = form.get("file")
+    if upload is None or not hasattr(upload, "read"):
+        return None, JSONResponse({"error": "No file part"}, status_code=400)
+    if upload.filename == '':
+        return None, JSONResponse({"error": "No selected file"}, status_code=400)
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, "wb") as f:
+        while True:
+            block = await upload.read(UPLOAD_READ_BYTES)
+            if not block:
+                break
+            f.write(block)
+    await upload.close()
+    return path, None
+
+
+async def run_scoring(timeout, fn, *args):
+    """Run ``fn`` in the pool; returns (result, error_response)."""
+    try:
+        return await pool.run(timeout, fn, *args), None
+    except PoolSaturated:
+        return None, JSONResponse({"error": "Scoring capacity exhausted, retry later"},
+                                  status_code=503, headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        return None, JSONResponse({"error": f"Scoring timed out after {timeout}s"}, status_code=504)
+
+
+def _json_default(o):
+    return o.item() if isinstance(o, np.generic) else str(o)
+
+
+def to_json_safe(obj):
+    return json.loads(json.dumps(obj, default=_json_default))
+
+
+# ----------------------
+# Routes
+# ----------------------
+async def index(request):
+    return PlainTextResponse("Insurance Risk Analytics API is running.")
+
+
+async def predict_csv(request):
+    global uploaded, uploaded_eda_preview
+    path, error = await save_upload(request)
+    if error is not None:
+        return error
+    table_path = os.path.splitext(path)[0] + ".arrow"
+    kept = False
+    try:
+        prediction_cache.check_artifacts()
+        # Parsing and summarising the whole file can take much longer than an interactive request
+        result, error = await run_scoring(INGEST_TIMEOUT_S, _ingest_upload, path, table_path)
+        if error is not None:
+            return error
+        (n_rows, n_cols), predictions, eda_preview = result
+        # Keep the Arrow file for pagination and drop the previous upload
+        previous, uploaded = uploaded, {"path": table_path, "rows": n_rows, "columns": n_cols}
+        kept = True
+        uploaded_eda_preview = eda_preview
+        if previous is not None:
+            _remove_file(previous["path"])
+        return JSONResponse(to_json_safe({
+            "total_rows": n_rows,
+            "preview": predictions,
+            "eda_preview": eda_preview,
+            "page": 0
+        }))
+    except Exception as e:
+        logging.error(f"Prediction error: {e}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        _remove_file(path)
+        if not kept:
+            _remove_file(table_path)
+            abandoned_files.add(table_path)
+
+
+async def get_chunk(request):
+    if uploaded is None:
+        return JSONResponse({"error": "No CSV uploaded"}, status_code=400)
+    try:
+        data = await request.json()
+        page = data.get("page", 0)
+        prediction_cache.check_artifacts()
+        result, error = await run_scoring(REQUEST_TIMEOUT_S, _score_page, uploaded["path"], page * PAGE_SIZE)
+        if error is not None:
+            return error
+        return JSONResponse(to_json_safe({
+            "rows": result,
+            "eda_preview": uploaded_eda_preview,
+            "page": page
+        }))
+    except Exception as e:
+        logging.error(f"Chunk error: {e}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def predict_row(request):
+    global model_input_cols
+    try:
+        data = await request.json()
+        prediction_cache.check_artifacts()
+        # Taken before any await: if the models are reloaded meanwhile, results from the old workers
+        # (and their input columns) are not kept
+        generation = prediction_cache.generation
+        inputs = model_input_cols
+        if inputs is None:
+            inputs, error = await run_scoring(REQUEST_TIMEOUT_S, _model_inputs)
+            if error is not None:
+                return error
+            if prediction_cache.generation == generation:
+                model_input_cols = inputs
+        keys = model_keys(data, inputs)
+        preds = {name: prediction_cache.get(key) for name, key in keys.items()}
+        missing = [name for name, value in preds.items() if value is None]
+        if missing:
+            result, error = await run_scoring(REQUEST_TIMEOUT_S, _predict_row, data, missing)
+            if error is not None:
+                return error
+            for name, value in result.items():
+                prediction_cache.put(keys[name], value, generation)
+                preds[name] = value
+        return JSONResponse({
+            "ClaimProbability": preds["claim"],
+            "ClaimSeverity": preds["severity"],
+            "PremiumPrediction": preds["premium"]
+        })
+    except Exception as e:
+        logging.error(f"Single row prediction error: {e}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ----------------------
+# Background scoring jobs: submit a file, poll status, stream results as NDJSON
+# ----------------------
+async def _run_job(job_id, path):
+    job = jobs[job_id]
+    fd, job["result_path"] = tempfile.mkstemp(suffix=".ndjson")
+    os.close(fd)
+    try:
+        job["status"] = "running"
+        result, error = await run_scoring(JOB_TIMEOUT_S, _score_file, path, job["result_path"])
+        if error is not None:
+            job["status"] = "failed"
+            job["error"] = json.loads(error.body)["error"]
+        else:
+            job["status"] = "done"
+            job["total_rows"] = result
+    except Exception as e:
+        logging.error(f"Job {job_id} error: {e}", exc_info=True)
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished"] = time.time()
+        os.remove(path)
+        if job["status"] != "done":
+            _remove_file(job["result_path"])
+
+
+def _evict_old_jobs():
+    finished = sorted((j["finished"], k) for k, j in jobs.items() if j["finished"] is not None)
+    while len(jobs) >= MAX_JOBS and finished:
+        job = jobs.pop(finished.pop(0)[1])
+        # A stream already reading the file keeps its open handle
+        _remove_file(job["result_path"])
+
+
+async def submit_job(request):
+    if pool.pending >= pool.max_pending:
+        return JSONResponse({"error": "Scoring capacity exhausted, retry later"},
+                            status_code=503, headers={"Retry-After": "1"})
+    path, error = await save_upload(request)
+    if error is not None:
+        return error
+    prediction_cache.check_artifacts()
+    _evict_old_jobs()
+    job_id = uuid.uuid4().hex
+    jobs[job_id] = {"status": "queued", "submitted": time.time(), "finished": None,
+                    "total_rows": None, "error": None, "result_path": None}
+    jobs[job_id]["task"] = asyncio.create_task(_run_job(job_id, path))
+    return JSONResponse({"job_id": job_id, "status": "queued"}, status_code=202)
+
+
+async def job_status(request):
+    job = jobs.get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    return JSONResponse({k: job[k] for k in ("status", "submitted", "finished", "total_rows", "error")})
+
+
+async def job_result(request):
+    job = jobs.get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    if job["status"] != "done":
+        return JSONResponse({"error": f"Job is {job['status']}"}, status_code=409)
+
+    def read_blocks(f):
+        # A sync iterator: Starlette reads it in a thread, so disk reads don't block the loop
+        with f:
+            while True:
+                block = f.read(RESULT_STREAM_BYTES)
+                if not block:
+                    break
+                yield block
+
+    # Opened here so a job evicted mid-stream still streams the complete file
+    return StreamingResponse(read_blocks(open(job["result_path"], "rb")), media_type="application/x-ndjson")
+
+
+async def cache_stats(request):
+    return JSONResponse(prediction_cache.stats())
+
+
+async def health(request):
+    return JSONResponse({
+        "pool": pool.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "jobs": len(jobs),
+        "uploaded_rows": 0 if uploaded is None else uploaded["rows"]
+    })
+
+
+async def geo_risk(request):
+    try:
+        index = current_geo_risk_index()
+        if index is None:
+            return JSONResponse({"error": "Geographic risk index not built"}, status_code=503)
+        if request.method == "GET":
+            # Single lookup, e.g. /api/geo_risk?PostalCode=2000&Province=gauteng
+            return JSONResponse(index.lookup(**request.query_params))
+
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or not isinstance(data.get("rows"), list):
+            return JSONResponse({"error": "Send {'rows': [{'PostalCode': ..., 'Province': ...}, ...]}"},
+                                status_code=400)
+        result = index.lookup_frame(pd.DataFrame(data["rows"]))
+        return JSONResponse({"rows": result.to_dict(orient="records"), "columns": GEO_RISK_COLS + ["level"],
+                             "months": index.manifest.get("months", [])})
+    except Exception as e:
+        logging.error(f"Geo risk error: {e}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ----------------------
+# App
+# ----------------------
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await pool.start()
+    try:
+        yield
+    finally:
+        pool.shutdown()
+        if uploaded is not None:
+            _remove_file(uploaded["path"])
+        for path in abandoned_files:
+            _remove_file(path)
+        for job in jobs.values():
+            if job["result_path"] is not None:
+                _remove_file(job["result_path"])
+
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/health", health),
+        Route("/api/predict_csv", predict_csv, methods=["POST"]),
+        Route("/api/get_chunk", get_chunk, methods=["POST"]),
+        Route("/api/predict_row", predict_row, methods=["POST"]),
+        Route("/api/cache_stats", cache_stats),
+        Route("/api/geo_risk", geo_risk, methods=["GET", "POST"]),
+        Route("/api/jobs", submit_job, methods=["POST"]),
+        Route("/api/jobs/{job_id}", job_status),
+        Route("/api/jobs/{job_id}/result", job_result),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
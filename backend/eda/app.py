@@ -1,3 +1,5 @@
+import os
+import sys
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
@@ -6,6 +8,11 @@ import joblib
 import logging
 from scipy.sparse import hstack, csr_matrix
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.model_config import (MODEL_PATHS, CLAIM_DROP_COLS, SEVERITY_DROP_COLS, SEVERITY_TARGET,
+                                  PREMIUM_DROP_COLS)
+from backend.prediction_cache import PredictionCache, model_inputs, model_keys
+
 # ----------------------
 # Logging setup
 # ----------------------
@@ -20,18 +27,34 @@ CORS(app)
 # ----------------------
 # Load models
 # ----------------------
-claim_model = joblib.load("models/logisticregression_claim_model.pkl")
-claim_scaler = joblib.load("models/scaler_claim.pkl")
-claim_ohe = joblib.load("models/ohe_claim.pkl")
+def load_models():
+    global claim_model, claim_scaler, claim_ohe, severity_model, premium_model
+    global NUM_COLS_CLAIM, CAT_COLS_CLAIM
+    # Load everything before swapping any global: a failed load (e.g. a half-written .pkl) raises here
+    # and leaves the previous set of models in place
+    loaded = {name: joblib.load(path) for name, path in MODEL_PATHS.items()}
+    claim_model = loaded["claim_model"]
+    claim_scaler = loaded["claim_scaler"]
+    claim_ohe = loaded["claim_ohe"]
 
-severity_model = joblib.load("models/random_forest_severity_model.pkl")
-premium_model = joblib.load("models/randomforest_premium_model_fast.pkl")
+    severity_model = loaded["severity_model"]
+    premium_model = loaded["premium_model"]
+    NUM_COLS_CLAIM = None
+    CAT_COLS_CLAIM = None
+    logging.info("Models loaded")
+
+load_models()
 
 # ----------------------
-# Store original feature names
+# Prediction cache for repeated single-policy quotes
 # ----------------------
-NUM_COLS_CLAIM = None
-CAT_COLS_CLAIM = None
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get("PREDICTION_CACHE_ENTRIES", 100_000)),
+    max_bytes=int(os.environ.get("PREDICTION_CACHE_MB", 64)) * 1024 * 1024,
+    ttl=float(os.environ.get("PREDICTION_CACHE_TTL_S", 3600)),
+    artifact_paths=MODEL_PATHS.values(),
+    on_artifacts_changed=load_models,
+)
 
 # ----------------------
 # Preprocessing functions
@@ -39,13 +62,7 @@ CAT_COLS_CLAIM = None
 def preprocess_claim_data(df):
     global NUM_COLS_CLAIM, CAT_COLS_CLAIM
 
-    drop_cols = [
-        "RecordID", "UnderwrittenCoverID", "PolicyID",
-        "TransactionMonth", "VehicleIntroDate",
-        "CalculatedPremiumPerTerm", "TotalPremium",
-        "SumInsured", "CapitalOutstanding"
-    ]
-    df = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
+    df = df.drop(columns=[c for c in CLAIM_DROP_COLS if c in df.columns], errors='ignore')
 
     if NUM_COLS_CLAIM is None:
         NUM_COLS_CLAIM = df.select_dtypes(include=[np.number]).columns.tolist()
@@ -90,22 +107,13 @@ def preprocess_claim_data(df):
     return X_scaled
 
 def preprocess_severity_data(df):
-    drop_cols = [
-        "RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth",
-        "Title", "Bank", "AccountType", "Gender", "Country", "Province",
-        "PostalCode", "MainCrestaZone", "SubCrestaZone", "ItemType", "mmcode",
-        "VehicleType", "make", "Model", "bodytype", "VehicleIntroDate",
-        "AlarmImmobiliser", "TrackingDevice",
-        "CapitalOutstanding", "SumInsured", "TotalPremium"
-    ]
-    df = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
-    X = df.drop(columns=["TotalClaims"], errors='ignore')
+    df = df.drop(columns=[c for c in SEVERITY_DROP_COLS if c in df.columns], errors='ignore')
+    X = df.drop(columns=[SEVERITY_TARGET], errors='ignore')
     logging.info(f"[Severity] Columns after drop: {X.columns.tolist()}")
     return X.fillna(0)
 
 def preprocess_premium_data(df):
-    drop_cols = ["RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth"]
-    X = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
+    X = df.drop(columns=[c for c in PREMIUM_DROP_COLS if c in df.columns], errors='ignore')
     logging.info(f"[Premium] Columns used: {X.columns.tolist()}")
     return X.fillna(0)
 
@@ -124,6 +132,8 @@ def predict_csv():
 
         df = pd.read_csv(file)
         logging.info(f"Uploaded CSV columns: {df.columns.tolist()}")
+        # Not cached, but still scored with the current artifacts
+        prediction_cache.check_artifacts()
 
         # Only keep first 10 rows
         df = df.head(10)
@@ -170,32 +180,55 @@ def predict_csv():
         return jsonify({"error": str(e)}), 500
 
 
+def cache_keys(data):
+    # Pipelines fitted on DataFrames know their input columns; narrow the key to those
+    inputs = model_inputs({"claim": claim_model, "severity": severity_model, "premium": premium_model})
+    return model_keys(data, inputs)
+
 # Predict for a single row by index
 @app.route("/api/predict_row", methods=["POST"])
 def predict_row():
     try:
         data = request.json
-        row_data = pd.DataFrame([data])
+        prediction_cache.check_artifacts()
+        # Taken before predicting: if the models are reloaded meanwhile, these results are not cached
+        generation = prediction_cache.generation
+        keys = cache_keys(data)
+        preds = {name: prediction_cache.get(key) for name, key in keys.items()}
 
-        claim_X = preprocess_claim_data(row_data)
-        claim_pred = claim_model.predict_proba(claim_X)[:, 1][0]
+        # Only build a DataFrame for the models that missed the cache
+        if any(v is None for v in preds.values()):
+            row_data = pd.DataFrame([data])
 
-        severity_X = preprocess_severity_data(row_data)
-        severity_pred = severity_model.predict(severity_X)[0]
+            if preds["claim"] is None:
+                claim_X = preprocess_claim_data(row_data)
+                preds["claim"] = float(claim_model.predict_proba(claim_X)[:, 1][0])
 
-        premium_X = preprocess_premium_data(row_data)
-        premium_pred = premium_model.predict(premium_X)[0]
+            if preds["severity"] is None:
+                severity_X = preprocess_severity_data(row_data)
+                preds["severity"] = float(severity_model.predict(severity_X)[0])
+
+            if preds["premium"] is None:
+                premium_X = preprocess_premium_data(row_data)
+                preds["premium"] = float(premium_model.predict(premium_X)[0])
+
+            for name, key in keys.items():
+                prediction_cache.put(key, preds[name], generation)
 
         return jsonify({
-            "ClaimProbability": claim_pred,
-            "ClaimSeverity": severity_pred,
-            "PremiumPrediction": premium_pred
+            "ClaimProbability": preds["claim"],
+            "ClaimSeverity": preds["severity"],
+            "PremiumPrediction": preds["premium"]
         })
 
     except Exception as e:
         logging.error(f"Single row prediction error: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/cache_stats", methods=["GET"])
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
 @app.route("/")
 def index():
     return "Insurance Risk Analytics API is running."
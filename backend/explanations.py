@@ -0,0 +1,382 @@
+"""
+Per-feature explanations of the claim, severity and premium predictions.
+
+Attributions are additive: ``base_value + sum(contributions) == model output`` for every row.
+
+- Tree models (the severity/premium pipelines' regressors) use ``shap.TreeExplainer`` when ``shap`` is
+  installed, otherwise path attributions computed from ``decision_path`` (the Saabas method, what
+  ``TreeExplainer(...).shap_values(approximate=True)`` returns) in a single sparse product per batch.
+- Linear models (the claim logistic regression) use exact linear SHAP against the background mean:
+  ``coef * (x - mean)``, in log-odds.
+
+Contributions of one-hot / scaled columns are summed back to the input columns the API receives.
+Background means, expected values and global importances are computed offline by
+``python -m backend.explanations --data <processed csv>`` and saved next to the models.
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+try:
+    import shap
+except ImportError:  # optional: path attributions are used instead
+    shap = None
+
+BACKGROUND_PATH = "models/explainer_background.pkl"
+
+
+# ----------------------
+# Feature-name bookkeeping
+# ----------------------
+def source_columns(output_names, input_cols):
+    """Index of the input column each transformed column came from (``num__x``, ``cat__Province_gauteng``...)."""
+    input_cols = list(input_cols)
+    by_length = sorted(range(len(input_cols)), key=lambda i: -len(input_cols[i]))
+    sources = []
+    for name in output_names:
+        name = str(name).split("__", 1)[1] if "__" in str(name) else str(name)
+        match = next((i for i in by_length
+                      if name == input_cols[i] or name.startswith(input_cols[i] + "_")), -1)
+        sources.append(match)
+    return np.array(sources)
+
+
+def aggregation_matrix(sources, n_inputs):
+    """Sparse (n_outputs, n_inputs) 0/1 matrix summing transformed columns into their input column."""
+    rows = np.flatnonzero(sources >= 0)
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, sources[rows])), shape=(len(sources), n_inputs))
+
+
+# ----------------------
+# Attribution methods
+# ----------------------
+def _path_matrix(tree, n_features):
+    # Node -> (feature split on by its parent, value change from parent to node)
+    t = tree.tree_
+    parent = np.full(t.node_count, -1)
+    for side in (t.children_left, t.children_right):
+        has_child = side >= 0
+        parent[side[has_child]] = np.flatnonzero(has_child)
+    value = t.value[:, 0, 0]
+    child = np.flatnonzero(parent >= 0)
+    return sparse.csr_matrix(
+        (value[child] - value[parent[child]], (child, t.feature[parent[child]])),
+        shape=(t.node_count, n_features),
+    ), value[0]
+
+
+def tree_path_matrices(estimator):
+    """Stacked node -> feature contribution matrix for every tree (rows follow ``decision_path``) and the mean root value."""
+    trees = getattr(estimator, "estimators_", [estimator])
+    per_tree = [_path_matrix(tree, estimator.n_features_in_) for tree in trees]
+    stacked = sparse.vstack([m for m, _ in per_tree], format="csr") / len(trees)
+    return stacked, float(np.mean([b for _, b in per_tree]))
+
+
+def path_attributions(estimator, X, paths):
+    """Saabas attributions for a decision tree or a random forest of regression trees: (contribs, bias)."""
+    stacked, bias = paths
+    indicator = estimator.decision_path(X)
+    if isinstance(indicator, tuple):  # forests also return the per-tree node offsets
+        indicator = indicator[0]
+    return (indicator @ stacked).toarray(), np.full(X.shape[0], bias)
+
+
+def linear_attributions(estimator, X, background_mean):
+    coef = np.ravel(estimator.coef_)
+    mean = np.zeros(len(coef)) if background_mean is None else background_mean
+    if sparse.issparse(X):
+        contribs = X.multiply(coef).toarray() - coef * mean
+    else:
+        contribs = np.asarray(X) * coef - coef * mean
+    bias = float(np.ravel(estimator.intercept_)[0] + coef @ mean)
+    return contribs, np.full(X.shape[0], bias)
+
+
+def attribution_method(estimator):
+    if hasattr(estimator, "coef_"):
+        return "linear"
+    if shap is not None:
+        return "tree_shap"
+    if hasattr(estimator, "tree_") or all(hasattr(t, "tree_") for t in getattr(estimator, "estimators_", [None])):
+        return "tree_path"
+    raise ValueError(f"No attribution method for {type(estimator).__name__}")
+
+
+# ----------------------
+# One model
+# ----------------------
+class ModelExplainer:
+    """
+    Explains one model. ``transform(df)`` returns the matrix the estimator scores; ``feature_names()``
+    returns ``(transformed_names, input_columns)`` and is called after the first transform, since some
+    preprocessors only learn their columns then.
+    """
+
+    def __init__(self, name, estimator, transform, feature_names, classifier=False):
+        self.name = name
+        self.estimator = estimator
+        self.transform = transform
+        self.feature_names = feature_names
+        self.classifier = classifier
+        self.method = attribution_method(estimator)
+        self.background_mean = None
+        self._aggregate = None
+        self._input_cols = None
+        self._shap = None
+        self._paths = None
+
+    def _aggregation(self, n_outputs):
+        if self._aggregate is None:
+            output_names, input_cols = self.feature_names()
+            output_names = list(output_names)[:n_outputs]
+            # Pad when a preprocessor emits more columns than it names (e.g. claim padding to the scaler width)
+            output_names += [f"__unnamed_{i}" for i in range(len(output_names), n_outputs)]
+            self._input_cols = list(input_cols)
+            self._aggregate = aggregation_matrix(source_columns(output_names, input_cols), len(input_cols))
+        return self._aggregate
+
+    def attributions(self, X):
+        if self.method == "linear":
+            return linear_attributions(self.estimator, X, self.background_mean)
+        if self.method == "tree_shap":
+            if self._shap is None:
+                self._shap = shap.TreeExplainer(self.estimator)
+            dense = X.toarray() if sparse.issparse(X) else np.asarray(X)
+            base = np.ravel(self._shap.expected_value)[0]
+            return np.asarray(self._shap.shap_values(dense)), np.full(dense.shape[0], float(base))
+        if self._paths is None:
+            self._paths = tree_path_matrices(self.estimator)
+        return path_attributions(self.estimator, X, self._paths)
+
+    def explain_frame(self, df):
+        """Per-row ``{"base_value", "output", "contributions": {input column: value}}`` for ``df``."""
+        X = self.transform(df)
+        contribs, bias = self.attributions(X)
+        by_input = np.asarray(self._aggregation(contribs.shape[1]).T @ contribs.T).T
+        output = bias + contribs.sum(axis=1)
+        results = []
+        for i in range(len(df)):
+            row = {
+                "method": self.method,
+                "base_value": float(bias[i]),
+                "output": float(output[i]),
+                "contributions": dict(zip(self._input_cols, by_input[i].round(8).tolist())),
+            }
+            if self.classifier:
+                # Attributions are in log-odds; report the probability alongside
+                row["output_scale"] = "log_odds"
+                row["probability"] = float(1 / (1 + np.exp(-output[i])))
+            results.append(row)
+        return results
+
+    def background_summary(self, df):
+        """Background mean of the transformed features, expected output and mean |contribution| per input."""
+        X = self.transform(df)
+        self.background_mean = np.asarray(X.mean(axis=0)).ravel()
+        explained = self.explain_frame(df)
+        importance = pd.DataFrame([r["contributions"] for r in explained]).abs().mean()
+        return {
+            "method": self.method,
+            "background_mean": self.background_mean,
+            "expected_value": float(np.mean([r["output"] for r in explained])),
+            "global_importance": importance.sort_values(ascending=False).round(8).to_dict(),
+            "n_background": len(df),
+        }
+
+
+# ----------------------
+# Batched, cached service
+# ----------------------
+class ExplanationQueueFull(RuntimeError):
+    pass
+
+
+class ExplanationService:
+    """
+    Explains rows for several models under a latency budget.
+
+    Attributions are cached per model under a hash of the features that model sees (the same keys as
+    predictions, namespaced with ``explain:``). Misses are grouped into batches and computed in a thread
+    pool; whatever is not finished when the budget runs out is reported as pending and still written
+    to the cache when it completes, so a retry returns it immediately. A retry that arrives while a row is
+    still being computed waits on the batch already running instead of submitting it again, and at most
+    ``max_pending`` batches are queued or running at once (``ExplanationQueueFull`` beyond that).
+    """
+
+    def __init__(self, explainers, cache, key_fn, background=None, batch_size=64, max_workers=2,
+                 budget_s=2.0, top_n=10, max_pending=64):
+        self.explainers = explainers
+        self.cache = cache
+        self.key_fn = key_fn
+        self.background = background or {}
+        self.batch_size = batch_size
+        self.budget_s = budget_s
+        self.top_n = top_n
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="explain")
+        # key -> (future, position in its batch) for rows queued or being computed; reentrant because a
+        # done-callback runs immediately in the submitting thread if the batch already finished
+        self._inflight = {}
+        self._pending = 0
+        self._lock = threading.RLock()
+        for name, summary in self.background.items():
+            if name in explainers:
+                explainers[name].background_mean = summary["background_mean"]
+
+    def global_importance(self, top_n=None):
+        return {
+            name: {
+                "method": summary["method"],
+                "expected_value": summary["expected_value"],
+                "n_background": summary["n_background"],
+                # A ranked list: JSON object key order is not preserved by every client (or jsonify)
+                "global_importance": [{"feature": f, "mean_abs_contribution": v}
+                                      for f, v in list(summary["global_importance"].items())[:top_n or None]],
+            }
+            for name, summary in self.background.items()
+        }
+
+    def _compute(self, name, keys, rows):
+        results = self.explainers[name].explain_frame(pd.DataFrame(rows))
+        for key, result in zip(keys, results):
+            self.cache.put(key, result)
+        return results
+
+    def _present(self, name, result, top_n):
+        out = {k: v for k, v in result.items() if k != "contributions"}
+        ranked = sorted(result["contributions"].items(), key=lambda kv: abs(kv[1]), reverse=True)
+        out["contributions"] = [{"feature": f, "contribution": c} for f, c in ranked[:top_n]]
+        out["other_contributions"] = float(sum(c for _, c in ranked[top_n:]))
+        if name in self.background:
+            out["expected_value"] = self.background[name]["expected_value"]
+        return out
+
+    def _finished(self, future, keys):
+        with self._lock:
+            self._pending -= 1
+            for key in keys:
+                if self._inflight.get(key, (None,))[0] is future:
+                    del self._inflight[key]
+
+    def _check_models(self, models):
+        if models is None:
+            return list(self.explainers)
+        if not isinstance(models, list) or not all(isinstance(m, str) for m in models):
+            raise ValueError("'models' must be a list of model names")
+        unknown = [m for m in models if m not in self.explainers]
+        if unknown:
+            raise ValueError(f"Unknown models {unknown}; available: {list(self.explainers)}")
+        return models
+
+    def explain(self, rows, models=None, top_n=None, budget_s=None):
+        deadline = time.monotonic() + (self.budget_s if budget_s is None else budget_s)
+        top_n = top_n or self.top_n
+        models = self._check_models(models)
+        explanations = [{} for _ in rows]
+        waiting = {}      # future -> (model name, [(position in the future's batch, row indices)])
+        new_batches = []  # (model name, keys, rows, row indices per key)
+
+        with self._lock:
+            for name in models:
+                # Unique missing rows for this model; rows already being computed join their batch
+                missing = {}
+                for i, row in enumerate(rows):
+                    key = self.key_fn(name, row)
+                    cached = self.cache.get(key)
+                    if cached is not None:
+                        explanations[i][name] = self._present(name, cached, top_n)
+                    elif key in self._inflight:
+                        future, position = self._inflight[key]
+                        waiting.setdefault(future, (name, []))[1].append((position, [i]))
+                    else:
+                        missing.setdefault(key, (row, []))[1].append(i)
+                keys = list(missing)
+                for start in range(0, len(keys), self.batch_size):
+                    batch = keys[start:start + self.batch_size]
+                    new_batches.append((name, batch, [missing[k][0] for k in batch], [missing[k][1] for k in batch]))
+
+            if self._pending + len(new_batches) > self.max_pending:
+                raise ExplanationQueueFull(f"{self._pending} explanation batches queued; retry later")
+            for name, keys, batch_rows, rows_at in new_batches:
+                future = self._pool.submit(self._compute, name, keys, batch_rows)
+                self._pending += 1
+                for position, key in enumerate(keys):
+                    self._inflight[key] = (future, position)
+                waiting[future] = (name, list(enumerate(rows_at)))
+                future.add_done_callback(lambda f, keys=keys: self._finished(f, keys))
+
+        done, not_done = wait(waiting, timeout=max(0.0, deadline - time.monotonic()))
+        errors = []
+        for future in done:
+            name, positions = waiting[future]
+            try:
+                results = future.result()
+            except Exception as e:  # surface per-model failures without dropping the other models
+                logging.error(f"Explanation error for {name}: {e}", exc_info=True)
+                errors.append(f"{name}: {e}")
+                for _, rows_at in positions:
+                    for i in rows_at:
+                        explanations[i][name] = {"status": "error"}
+                continue
+            for position, rows_at in positions:
+                for i in rows_at:
+                    explanations[i][name] = self._present(name, results[position], top_n)
+        for future in not_done:
+            name, positions = waiting[future]
+            for _, rows_at in positions:
+                for i in rows_at:
+                    explanations[i][name] = {"status": "pending"}
+        if errors:
+            status = "partial" if not_done else "error"
+        else:
+            status = "pending" if not_done else "complete"
+        return {"explanations": explanations, "status": status, "complete": status == "complete", "errors": errors}
+
+
+def load_background(path=BACKGROUND_PATH):
+    if not os.path.exists(path):
+        logging.warning(f"No explainer background at {path}; run `python -m backend.explanations` to build it")
+        return {}
+    return joblib.load(path)
+
+
+def build_background(explainers, df, path=BACKGROUND_PATH):
+    background = {}
+    for name, explainer in explainers.items():
+        t0 = time.perf_counter()
+        background[name] = explainer.background_summary(df)
+        logging.info(f"{name}: background of {len(df)} rows ({explainer.method}) in {time.perf_counter() - t0:.1f}s")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    joblib.dump(background, path)
+    logging.info(f"Explainer background saved to {path}")
+    return background
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute explainer background and global importances")
+    parser.add_argument("--data", default="data/processed/processed_insurance_data.csv")
+    parser.add_argument("--sample", type=int, default=5000)
+    parser.add_argument("--out", default=BACKGROUND_PATH)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from backend.app import build_explainers  # loads the models
+
+    df = pd.read_csv(args.data, low_memory=False)
+    df = df.sample(min(args.sample, len(df)), random_state=args.seed).reset_index(drop=True)
+    build_background(build_explainers(), df, args.out)
+
+
+if __name__ == "__main__":
+    main()
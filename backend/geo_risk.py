@@ -0,0 +1,334 @@
+"""
+Precomputed geographic risk factors by PostalCode, SubCrestaZone, MainCrestaZone and Province.
+
+Monthly sufficient statistics (policy-months, claim count, claim amount, premium) are kept per
+(Province, MainCrestaZone, SubCrestaZone, PostalCode, month) in ``monthly_stats.pkl``. Adding a file
+only aggregates its rows and adds their counts to the stats already held for the same keys (so a month can
+arrive in several files), and the index is rebuilt from the stats without rereading old data. Adding the
+same rows twice counts them twice; restated data needs ``--rebuild`` from the full history.
+
+Estimates are credibility-weighted top-down: each key's loss ratio and claim frequency are blended with
+its parent's (the parent that holds most of its exposure, then the overall book) with weight
+``Z = exposure / (exposure + credibility_k)``. So sparse postal codes fall back smoothly to their zone
+and province. ``risk_factor`` is the blended loss ratio relative to the overall loss ratio.
+
+Each level is saved as a sorted key array plus a value matrix (``.npy``, memory-mapped on load) and
+looked up by binary search. A build writes all arrays into a new ``index-<version>`` directory and then
+atomically replaces ``manifest.json``, which names the current version, so a reader loading during a
+rebuild gets either the old index or the new one, never a mix. The current and previous versions are kept. A query row takes the finest level whose key is in the table, and the
+overall values if none is.
+
+Usage (from the repo root; new rows are added to the existing stats):
+    python -m backend.geo_risk --data data/processed/processed_insurance_data.csv
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+GEO_RISK_DIR = "models/geo_risk"
+STATS_FILE = "monthly_stats.pkl"
+MANIFEST_FILE = "manifest.json"
+VERSION_PREFIX = "index-"
+
+# Finest to coarsest; the overall book sits above Province
+LEVELS = [
+    ("postal_code", "PostalCode"),
+    ("sub_zone", "SubCrestaZone"),
+    ("main_zone", "MainCrestaZone"),
+    ("province", "Province"),
+]
+GEO_COLS = [col for _, col in LEVELS]
+STAT_COLS = ["exposure", "claim_count", "claim_amount", "premium"]
+VALUE_COLS = ["risk_factor", "loss_ratio", "claim_frequency", "credibility", "exposure"]
+
+# Policy-months at which a key's own experience gets half the weight
+CREDIBILITY_K = 500
+
+
+# ----------------------
+# Key normalisation
+# ----------------------
+def normalise_keys(s):
+    """Geography values as lookup keys: postal codes as integer strings, names stripped and lower-cased."""
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        keys = s.round().astype("Int64").astype(str)
+    else:
+        keys = s.astype(str).str.strip().str.lower().str.replace(r"\.0+$", "", regex=True)
+    return keys.where(s.notna(), "")
+
+
+def normalise_key(value):
+    """Scalar version of ``normalise_keys`` for single lookups."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return str(int(round(value)))
+    return re.sub(r"\.0+$", "", str(value).strip().lower())
+
+
+# ----------------------
+# Monthly sufficient statistics
+# ----------------------
+def monthly_stats(df):
+    """Policy-months, claims and premium per geography and month for one batch of rows."""
+    keys = pd.DataFrame({col: normalise_keys(df[col]) if col in df.columns else "" for col in GEO_COLS},
+                        index=df.index)
+    keys["month"] = pd.to_datetime(df["TransactionMonth"], errors="coerce").dt.strftime("%Y-%m").fillna("")
+    claims = pd.to_numeric(df["TotalClaims"], errors="coerce").fillna(0)
+    keys["exposure"] = 1
+    keys["claim_count"] = (claims > 0).astype(int)
+    keys["claim_amount"] = claims
+    keys["premium"] = pd.to_numeric(df["TotalPremium"], errors="coerce").fillna(0)
+    return keys.groupby(GEO_COLS + ["month"], sort=False)[STAT_COLS].sum().reset_index()
+
+
+def stats_from_file(path, chunksize=200_000):
+    parts = []
+    usecols = lambda c: c in GEO_COLS + ["TransactionMonth", "TotalClaims", "TotalPremium"]
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize, low_memory=False):
+        parts.append(monthly_stats(chunk))
+    stats = pd.concat(parts, ignore_index=True)
+    # A month can span chunks: combine the partial sums
+    return stats.groupby(GEO_COLS + ["month"], sort=False)[STAT_COLS].sum().reset_index()
+
+
+def merge_stats(stats, new):
+    """Add ``new`` to ``stats`` per (geography, month); a month that arrives in several files is summed."""
+    if stats is None or stats.empty:
+        return new.reset_index(drop=True)
+    extended = sorted(set(new["month"]) & set(stats["month"]))
+    if extended:
+        logging.info(f"Adding to stats already held for months: {extended}")
+    merged = pd.concat([stats, new], ignore_index=True)
+    return merged.groupby(GEO_COLS + ["month"], sort=False)[STAT_COLS].sum().reset_index()
+
+
+# ----------------------
+# Credibility-weighted estimates
+# ----------------------
+def rates(totals):
+    """Own loss ratio and claim frequency; NaN where there is no premium or exposure."""
+    premium = totals["premium"].to_numpy(dtype=float)
+    exposure = totals["exposure"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loss_ratio = np.where(premium > 0, totals["claim_amount"].to_numpy(dtype=float) / premium, np.nan)
+        frequency = np.where(exposure > 0, totals["claim_count"].to_numpy(dtype=float) / exposure, np.nan)
+    return loss_ratio, frequency
+
+
+def modal_parent(stats, col, parent_col):
+    """Parent key holding most of each key's exposure (zones don't nest perfectly in the raw data)."""
+    pairs = stats[(stats[col] != "") & (stats[parent_col] != "")]
+    exposure = pairs.groupby([col, parent_col])["exposure"].sum()
+    if exposure.empty:
+        return pd.Series(dtype=str)
+    top = exposure.groupby(level=0).idxmax()
+    return pd.Series([p for _, p in top], index=top.index)
+
+
+def credibility_estimates(stats, credibility_k=CREDIBILITY_K):
+    """Per level, a frame indexed by key (sorted) with ``VALUE_COLS``; plus the overall values."""
+    total = stats[STAT_COLS].sum().to_frame().T
+    overall_lr, overall_freq = (float(v[0]) for v in rates(total))
+    overall_lr = 0.0 if np.isnan(overall_lr) else overall_lr
+    overall_freq = 0.0 if np.isnan(overall_freq) else overall_freq
+    overall = {"risk_factor": 1.0, "loss_ratio": overall_lr, "claim_frequency": overall_freq,
+               "credibility": 1.0, "exposure": float(total["exposure"].iloc[0])}
+
+    tables = {}
+    for i in reversed(range(len(LEVELS))):
+        name, col = LEVELS[i]
+        totals = stats[stats[col] != ""].groupby(col)[STAT_COLS].sum().sort_index()
+        prior_lr = np.full(len(totals), overall_lr)
+        prior_freq = np.full(len(totals), overall_freq)
+        if i + 1 < len(LEVELS):
+            parent_name, parent_col = LEVELS[i + 1]
+            parent = modal_parent(stats, col, parent_col).reindex(totals.index)
+            parent_table = tables[parent_name].reindex(parent)
+            prior_lr = parent_table["loss_ratio"].fillna(overall_lr).to_numpy()
+            prior_freq = parent_table["claim_frequency"].fillna(overall_freq).to_numpy()
+
+        own_lr, own_freq = rates(totals)
+        exposure = totals["exposure"].to_numpy(dtype=float)
+        z = exposure / (exposure + credibility_k)
+        loss_ratio = np.where(np.isnan(own_lr), prior_lr, z * np.nan_to_num(own_lr) + (1 - z) * prior_lr)
+        frequency = np.where(np.isnan(own_freq), prior_freq, z * np.nan_to_num(own_freq) + (1 - z) * prior_freq)
+        tables[name] = pd.DataFrame({
+            "risk_factor": loss_ratio / overall_lr if overall_lr > 0 else np.ones(len(totals)),
+            "loss_ratio": loss_ratio,
+            "claim_frequency": frequency,
+            "credibility": np.where(np.isnan(own_lr), 0.0, z),
+            "exposure": exposure,
+        }, index=totals.index)
+    return tables, overall
+
+
+# ----------------------
+# Build / save
+# ----------------------
+def _replace(path, save):
+    # Write next to the target and swap it in, so a reader never sees a half-written file
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        save(f)
+    os.replace(tmp, path)
+
+
+def _prune_versions(out_dir, keep):
+    for entry in os.listdir(out_dir):
+        if entry.startswith(VERSION_PREFIX) and entry not in keep:
+            shutil.rmtree(os.path.join(out_dir, entry), ignore_errors=True)
+
+
+def build_index(stats, out_dir=GEO_RISK_DIR, credibility_k=CREDIBILITY_K):
+    """Write the per-level sorted arrays into a new version directory, then the manifest that points readers at it."""
+    os.makedirs(out_dir, exist_ok=True)
+    previous = read_manifest(out_dir).get("version")
+    tables, overall = credibility_estimates(stats, credibility_k)
+    built_at = datetime.now(timezone.utc)
+    version = f"{VERSION_PREFIX}{built_at:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    version_dir = os.path.join(out_dir, version)
+    os.makedirs(version_dir)
+    for name, table in tables.items():
+        np.save(os.path.join(version_dir, f"{name}_keys.npy"), np.asarray(table.index, dtype=str))
+        np.save(os.path.join(version_dir, f"{name}_values.npy"), table[VALUE_COLS].to_numpy(dtype=np.float64))
+    _replace(os.path.join(out_dir, STATS_FILE), lambda f: stats.to_pickle(f, compression=None))
+
+    manifest = {
+        "version": version,
+        "built_at": built_at.isoformat(timespec="seconds"),
+        "months": sorted(m for m in stats["month"].unique() if m),
+        "credibility_k": credibility_k,
+        "overall": overall,
+        "levels": {name: len(table) for name, table in tables.items()},
+    }
+    _replace(os.path.join(out_dir, MANIFEST_FILE), lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+    # Keep the previous version too, for a reader that read the old manifest just before the swap
+    _prune_versions(out_dir, {version, previous})
+    logging.info(f"Geographic risk index for {len(manifest['months'])} months saved to {out_dir}: "
+                 f"{manifest['levels']}")
+    return manifest
+
+
+def read_manifest(out_dir=GEO_RISK_DIR):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_stats(out_dir=GEO_RISK_DIR):
+    path = os.path.join(out_dir, STATS_FILE)
+    return pd.read_pickle(path) if os.path.exists(path) else None
+
+
+def update_index(data_path, out_dir=GEO_RISK_DIR, credibility_k=CREDIBILITY_K, rebuild=False, chunksize=200_000):
+    """Merge the months in ``data_path`` into the saved stats and rebuild the index."""
+    new = stats_from_file(data_path, chunksize)
+    stats = merge_stats(None if rebuild else load_stats(out_dir), new)
+    return build_index(stats, out_dir, credibility_k)
+
+
+# ----------------------
+# Lookup
+# ----------------------
+class GeoRiskIndex:
+    def __init__(self, keys, values, overall, manifest=None, mtime=None):
+        self.keys = keys          # level -> sorted str array
+        self.values = values      # level -> (n_keys, len(VALUE_COLS)) array
+        self.overall = np.array([overall[c] for c in VALUE_COLS])
+        self.manifest = manifest or {}
+        self.mtime = mtime
+
+    @classmethod
+    def load(cls, out_dir=GEO_RISK_DIR):
+        manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+        mtime = os.path.getmtime(manifest_path)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        # Indexes built before versioning keep their arrays next to the manifest
+        index_dir = os.path.join(out_dir, manifest["version"]) if "version" in manifest else out_dir
+        keys, values = {}, {}
+        for name, _ in LEVELS:
+            keys[name] = np.load(os.path.join(index_dir, f"{name}_keys.npy"), mmap_mode="r")
+            values[name] = np.load(os.path.join(index_dir, f"{name}_values.npy"), mmap_mode="r")
+        return cls(keys, values, manifest["overall"], manifest, mtime)
+
+    def _find(self, name, key):
+        keys = self.keys[name]
+        i = int(np.searchsorted(keys, key))
+        return i if key and i < len(keys) and keys[i] == key else None
+
+    def lookup(self, **codes):
+        """Risk values for one location, e.g. ``lookup(PostalCode=2000, Province="gauteng")``."""
+        for name, col in LEVELS:
+            if col in codes:
+                i = self._find(name, normalise_key(codes[col]))
+                if i is not None:
+                    return {**dict(zip(VALUE_COLS, self.values[name][i].tolist())), "level": name}
+        return {**dict(zip(VALUE_COLS, self.overall.tolist())), "level": "overall"}
+
+    def lookup_frame(self, df):
+        """Vectorized ``lookup`` for every row of ``df``; returns ``VALUE_COLS`` + ``level`` on ``df``'s index."""
+        n = len(df)
+        values = np.tile(self.overall, (n, 1))
+        level = np.full(n, "overall", dtype=object)
+        resolved = np.zeros(n, dtype=bool)
+        for name, col in LEVELS:
+            keys = self.keys[name]
+            if col not in df.columns or len(keys) == 0:
+                continue
+            query = normalise_keys(df[col]).to_numpy(dtype=str)
+            pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+            hit = ~resolved & (query != "") & (np.asarray(keys[pos]) == query)
+            values[hit] = self.values[name][pos[hit]]
+            level[hit] = name
+            resolved |= hit
+        out = pd.DataFrame(values, columns=VALUE_COLS, index=df.index)
+        out["level"] = level
+        return out
+
+
+def load_index(out_dir=GEO_RISK_DIR, current=None, quiet=False):
+    """``current`` if the saved index hasn't changed since it was loaded, else a fresh load (None if not built)."""
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        if current is None and not quiet:
+            logging.warning(f"No geographic risk index at {out_dir}; run `python -m backend.geo_risk` to build it")
+        return current
+    if current is not None and current.mtime == os.path.getmtime(manifest_path):
+        return current
+    try:
+        return GeoRiskIndex.load(out_dir)
+    except FileNotFoundError:
+        # The version named by the manifest we read was pruned by two rebuilds in between; read it again
+        return GeoRiskIndex.load(out_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the geographic risk-factor index")
+    parser.add_argument("--data", default="data/processed/processed_insurance_data.csv",
+                        help="Rows to add to the saved stats (rows already added would be counted twice)")
+    parser.add_argument("--out", default=GEO_RISK_DIR)
+    parser.add_argument("--credibility-k", type=float, default=CREDIBILITY_K)
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Ignore the saved stats and rebuild from --data (e.g. after restated data)")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    update_index(args.data, args.out, args.credibility_k, args.rebuild, args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
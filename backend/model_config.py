@@ -0,0 +1,34 @@
+# ----------------------
+# Model artifacts and feature columns shared by backend/app.py, backend/eda/app.py and backend/asgi.py
+# ----------------------
+MODEL_PATHS = {
+    "claim_model": "models/logisticregression_claim_model.pkl",
+    "claim_scaler": "models/scaler_claim.pkl",
+    "claim_ohe": "models/ohe_claim.pkl",
+    "severity_model": "models/random_forest_severity_model.pkl",
+    "premium_model": "models/randomforest_premium_model_fast.pkl",
+}
+
+# ----------------------
+# Columns each model's preprocessor drops before scoring
+# ----------------------
+ID_COLS = ["RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth"]
+
+CLAIM_DROP_COLS = ["RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth", "VehicleIntroDate",
+                   "CalculatedPremiumPerTerm", "TotalPremium", "SumInsured", "CapitalOutstanding"]
+
+SEVERITY_DROP_COLS = ["RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth", "Title", "Bank",
+                      "AccountType", "Gender", "Country", "Province", "PostalCode", "MainCrestaZone",
+                      "SubCrestaZone", "ItemType", "mmcode", "VehicleType", "make", "Model", "bodytype",
+                      "VehicleIntroDate", "AlarmImmobiliser", "TrackingDevice", "CapitalOutstanding",
+                      "SumInsured", "TotalPremium"]
+SEVERITY_TARGET = "TotalClaims"
+
+PREMIUM_DROP_COLS = ["RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth"]
+
+# Columns that never reach each model (drop list plus target), used to key cached predictions
+MODEL_IGNORED_COLS = {
+    "claim": CLAIM_DROP_COLS,
+    "severity": SEVERITY_DROP_COLS + [SEVERITY_TARGET],
+    "premium": PREMIUM_DROP_COLS,
+}
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.model_config import MODEL_IGNORED_COLS
+
+# Rough per-entry bookkeeping cost (OrderedDict node, tuple, expiry float) on top of key/value sizes
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def feature_key(model_name, row, ignored=(), used=None):
+    """
+    Canonical content hash of the features ``model_name`` actually sees in ``row`` (a plain dict).
+
+    Columns in ``ignored`` are left out; if ``used`` is given only those columns are kept. Keys are
+    sorted and values JSON-encoded, so field order in the request and fields the model never reads
+    do not change the key. Pure Python: no pandas on the lookup path.
+    """
+    ignored = set(ignored)
+    if used is not None:
+        relevant = {k: row.get(k) for k in used if k not in ignored}
+    else:
+        relevant = {k: v for k, v in row.items() if k not in ignored}
+    payload = json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str)
+    return model_name, hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def model_inputs(models):
+    """Input columns of each fitted model (``feature_names_in_``); None where the model doesn't record them."""
+    return {name: (list(model.feature_names_in_) if hasattr(model, "feature_names_in_") else None)
+            for name, model in models.items()}
+
+
+def model_keys(row, inputs, prefix=""):
+    """
+    Cache keys of ``row`` for each model in ``inputs`` (name -> input columns from ``model_inputs``).
+
+    Every app builds keys here, so a field a model never reads (dropped, or not among its input
+    columns) never changes that model's key, whichever server answers.
+    """
+    return {name: feature_key(prefix + name, row, MODEL_IGNORED_COLS[name], used) for name, used in inputs.items()}
+
+
+def shallow_sizeof(value):
+    # Enough for scalar predictions
+    return sys.getsizeof(value)
+
+
+def deep_sizeof(value):
+    """
+    Size of ``value`` including nested dict values, lists, tuples and sets, for structured values such as
+    explanations. Dict keys are left out: in cached results they are feature names shared by every entry.
+    """
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+def artifact_fingerprint(paths):
+    fingerprint = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            fingerprint.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache of per-model predictions with a TTL and a memory bound. Entry sizes come from
+    ``size_fn``; the default is shallow, so pass ``deep_sizeof`` for nested values.
+
+    The cache watches ``artifact_paths``; when any model file changes (mtime/size) every entry is
+    dropped and ``on_artifacts_changed`` is called, so callers can reload models before new entries
+    are written. The check runs at most once every ``check_interval`` seconds. If the reload raises
+    (e.g. a ``.pkl`` still being written) the change is not recorded, so the next check retries it.
+
+    Every clear bumps ``generation``. A caller that computes a value outside the cache reads the generation
+    first and passes it to ``put``, so a result from models that were replaced meanwhile is dropped
+    instead of being served from then on.
+    """
+
+    def __init__(self, max_entries=100_000, max_bytes=64 * 1024 * 1024, ttl=3600,
+                 artifact_paths=(), check_interval=5.0, on_artifacts_changed=None, size_fn=shallow_sizeof):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.artifact_paths = list(artifact_paths)
+        self.check_interval = check_interval
+        self.on_artifacts_changed = on_artifacts_changed
+        self.size_fn = size_fn
+
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._fingerprint = artifact_fingerprint(self.artifact_paths)
+        self._last_check = time.monotonic()
+        self.generation = 0
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0,
+                       "stale_puts": 0}
+
+    # ----------------------
+    # Lookup / insert
+    # ----------------------
+    def get(self, key):
+        self.check_artifacts()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at < now:
+                self._remove(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """Store ``value``; with ``generation`` (read before computing it), skip it if the cache was cleared since."""
+        size = (sys.getsizeof(key) + sum(sys.getsizeof(k) for k in key)
+                + self.size_fn(value) + ENTRY_OVERHEAD_BYTES)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self._stats["stale_puts"] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.generation += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    # ----------------------
+    # Invalidation on model artifact changes
+    # ----------------------
+    def check_artifacts(self):
+        """Drop the cache and reload models if artifacts changed; called by ``get`` and by uncached scoring paths."""
+        if not self.artifact_paths:
+            return
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        # Only one thread stats the files / reloads; others keep serving
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_check = now
+            fingerprint = artifact_fingerprint(self.artifact_paths)
+            if fingerprint == self._fingerprint:
+                return
+            logging.info("Model artifacts changed on disk; invalidating prediction cache")
+            self.clear()
+            if self.on_artifacts_changed is not None:
+                try:
+                    self.on_artifacts_changed()
+                except Exception as e:
+                    logging.error(f"Reloading models failed, keeping the previous ones and retrying: {e}",
+                                  exc_info=True)
+                    return
+            self._fingerprint = fingerprint
+            # Drop anything written with the old models while they were being reloaded
+            self.clear()
+            with self._lock:
+                self._stats["invalidations"] += 1
+        finally:
+            self._check_lock.release()
+
+    # ----------------------
+    # Stats
+    # ----------------------
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "generation": self.generation,
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,214 @@
+"""
+Mergeable running statistics for uploaded datasets.
+
+``DatasetSummary`` is updated chunk by chunk as a file is ingested and produces the same
+``{"numeric_summary": ..., "top_categories": ...}`` shape as ``get_eda_preview``, but over the whole
+file instead of a random sample. Counts, means, variances and min/max are exact. Quantiles are exact
+(``Series.quantile``) when the summary is built from an in-memory frame with ``from_frame``; summaries
+built chunk by chunk or merged use a KLL sketch, which bounds rank error rather than value error. Top
+categories come from a Misra-Gries heavy-hitter summary (exact whenever a column has fewer distinct values
+than the summary capacity). Every part can be merged, so summaries built on separate chunks or workers
+combine into the whole-file result.
+"""
+import math
+import numpy as np
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+# ----------------------
+# Approximate quantiles
+# ----------------------
+class QuantileSketch:
+    """
+    KLL sketch: bounds the *rank* error of each quantile, so it works the same for years as for amounts.
+
+    Level ``h`` holds items standing for ``2**h`` values each; a full level is sorted and every other
+    item (random offset) is promoted. With the default ``k=200`` a returned quantile's rank is typically
+    within ~1% of the requested one; below ``k`` values nothing is compacted and quantiles are exact.
+    """
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h):
+        # Lower levels get geometrically smaller (factor 2/3) than the top one
+        return max(int(math.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - h))), 2)
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                odd = len(level) % 2  # an odd item out stays on this level
+                promoted = level[odd:][self._rng.integers(2)::2]
+                self.levels[h] = level[:odd]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def update(self, values):
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += int(values.size)
+        self._compress()
+
+    def merge(self, other):
+        for h, level in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.count += other.count
+        self._compress()
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        if len(self.levels) == 1:
+            # Nothing compacted yet: exact, interpolated like Series.quantile
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cum = np.cumsum(weights[order])
+        i = min(int(np.searchsorted(cum, q * cum[-1], side="right")), len(values) - 1)
+        return float(values[order][i])
+
+
+# ----------------------
+# Numeric columns
+# ----------------------
+class NumericStats:
+    """Exact count/mean/variance/min/max (Chan et al. parallel update) plus a quantile sketch."""
+
+    def __init__(self, sketch_k=200):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(sketch_k)
+        # Exact quantiles when the whole column was at hand (``DatasetSummary.from_frame``)
+        self.quantiles = None
+
+    def _combine(self, n, mean, m2, vmin, vmax):
+        if n == 0:
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        mean = float(values.mean())
+        self._combine(int(values.size), mean, float(((values - mean) ** 2).sum()),
+                      float(values.min()), float(values.max()))
+        self.sketch.update(values)
+        self.quantiles = None
+
+    def merge(self, other):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        self.sketch.merge(other.sketch)
+        self.quantiles = None
+
+    def summary(self):
+        """Same keys as ``Series.describe()``; sketched quantiles are clamped to the exact min/max."""
+        if self.count == 0:
+            return {"count": 0.0, "mean": None, "std": None, "min": None,
+                    "25%": None, "50%": None, "75%": None, "max": None}
+        std = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+        out = {"count": float(self.count), "mean": self.mean, "std": std, "min": self.min}
+        for i, q in enumerate(QUANTILES):
+            value = self.quantiles[i] if self.quantiles is not None else self.sketch.quantile(q)
+            out[f"{int(q * 100)}%"] = min(max(value, self.min), self.max)
+        out["max"] = self.max
+        return out
+
+
+# ----------------------
+# Categorical columns
+# ----------------------
+class TopK:
+    """Misra-Gries heavy hitters: keeps at most ``capacity`` counters, undercounting by at most n / capacity."""
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.counts = {}
+
+    def _merge_counts(self, counts):
+        for value, c in counts.items():
+            self.counts[value] = self.counts.get(value, 0) + c
+        if len(self.counts) > self.capacity:
+            # Subtract the (capacity + 1)-th largest count and drop counters that reach zero
+            cut = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {v: c - cut for v, c in self.counts.items() if c > cut}
+
+    def update(self, series):
+        vc = series.value_counts()
+        self._merge_counts({k: int(c) for k, c in vc[vc > 0].items()})
+
+    def merge(self, other):
+        self._merge_counts(other.counts)
+
+    def top(self, n=5):
+        return dict(sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n])
+
+
+# ----------------------
+# Whole-dataset summary
+# ----------------------
+class DatasetSummary:
+    def __init__(self, sketch_k=200, topk_capacity=64):
+        self.sketch_k = sketch_k
+        self.topk_capacity = topk_capacity
+        self.n_rows = 0
+        self.numeric = {}
+        self.categorical = {}
+
+    @classmethod
+    def from_frame(cls, df, chunksize=100_000, **kwargs):
+        summary = cls(**kwargs)
+        for start in range(0, len(df), chunksize):
+            summary.update(df.iloc[start:start + chunksize])
+        # The whole frame is in memory, so quantiles needn't be approximated
+        for col, stats in summary.numeric.items():
+            if stats.count:
+                stats.quantiles = [float(v) for v in df[col].quantile(list(QUANTILES))]
+        return summary
+
+    def update(self, df_chunk):
+        # Same column selection as get_eda_preview: describe() covers numbers, top-k covers the rest
+        for col in df_chunk.select_dtypes(include=[np.number]).columns:
+            stats = self.numeric.setdefault(col, NumericStats(self.sketch_k))
+            stats.update(df_chunk[col].to_numpy(dtype=float, na_value=np.nan))
+        for col in df_chunk.select_dtypes(include=['object', 'bool', 'category']).columns:
+            self.categorical.setdefault(col, TopK(self.topk_capacity)).update(df_chunk[col])
+        self.n_rows += len(df_chunk)
+
+    def merge(self, other):
+        for col, stats in other.numeric.items():
+            self.numeric.setdefault(col, NumericStats(self.sketch_k)).merge(stats)
+        for col, topk in other.categorical.items():
+            self.categorical.setdefault(col, TopK(self.topk_capacity)).merge(topk)
+        self.n_rows += other.n_rows
+
+    def to_eda_preview(self, top_n=5):
+        return {
+            "numeric_summary": {col: stats.summary() for col, stats in self.numeric.items()},
+            "top_categories": {col: topk.top(top_n) for col, topk in self.categorical.items()},
+            "total_rows": self.n_rows,
+        }
@@ -0,0 +1,466 @@
+"""
+Load-test and benchmark harness for the backend APIs.
+
+Builds synthetic policy rows and stand-in model artifacts in a scratch directory, imports
+``backend/app.py`` and ``backend/eda/app.py`` against them, and drives the endpoints either
+in-process (Flask test client) or over localhost (threaded werkzeug server) at a configurable
+concurrency, or against the ASGI serving mode (``backend/asgi.py``) under uvicorn. Results are written as JSON so runs can be compared across commits.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_api --mode both --concurrency 1 4 16 --requests 200
+    python -m benchmarks.bench_api --mode all --endpoints index --background predict_csv
+    python -m benchmarks.bench_api --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.synthetic import make_policy_rows, write_stand_in_models
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+APPS = {
+    "backend": os.path.join(REPO_ROOT, "backend", "app.py"),
+    "backend_eda": os.path.join(REPO_ROOT, "backend", "eda", "app.py"),
+}
+
+# Endpoint -> app that serves it
+ENDPOINTS = {
+    "predict_csv": "backend",
+    "get_chunk": "backend",
+    "predict_row": "backend_eda",
+    "index": "backend",
+}
+
+
+# ----------------------
+# Environment setup
+# ----------------------
+def prepare_workdir(workdir, seed):
+    """Write stand-in models into ``workdir/models`` and chdir there so the apps can load them."""
+    write_stand_in_models(os.path.join(workdir, "models"), seed=seed)
+    os.chdir(workdir)
+
+
+def load_app(name):
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", APPS[name])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    # ru_maxrss is the peak, reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ----------------------
+# Request payloads
+# ----------------------
+def build_payloads(csv_rows, seed):
+    df = make_policy_rows(max(csv_rows, 100), seed + 1)
+    csv_bytes = df.head(csv_rows).to_csv(index=False).encode("utf-8")
+    rows = json.loads(df.head(100).to_json(orient="records"))
+    return {"csv": csv_bytes, "rows": rows, "n_pages": max(csv_rows // 10, 1)}
+
+
+def multipart_body(field, filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+    ).encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def request_spec(endpoint, payloads, rng):
+    """Return (method, path, body_bytes, content_type) for one request."""
+    if endpoint == "predict_csv":
+        body, ctype = multipart_body("file", "policies.csv", payloads["csv"])
+        return "POST", "/api/predict_csv", body, ctype
+    if endpoint == "get_chunk":
+        body = json.dumps({"page": rng.randrange(payloads["n_pages"])}).encode("utf-8")
+        return "POST", "/api/get_chunk", body, "application/json"
+    if endpoint == "predict_row":
+        body = json.dumps(rng.choice(payloads["rows"])).encode("utf-8")
+        return "POST", "/api/predict_row", body, "application/json"
+    return "GET", "/", None, None
+
+
+# ----------------------
+# Transports
+# ----------------------
+class InProcessClient:
+    def __init__(self, flask_app):
+        self.app = flask_app
+
+    def server_rss_mb(self):
+        return rss_mb()
+
+    def close(self):
+        pass
+
+    def send(self, method, path, body, ctype):
+        client = self.app.test_client()
+        headers = {"Content-Type": ctype} if ctype else {}
+        resp = client.open(path, method=method, data=body, headers=headers)
+        return resp.status_code
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def send(self, method, path, body, ctype):
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if ctype:
+            req.add_header("Content-Type", ctype)
+        try:
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def server_rss_mb(self):
+        return rss_mb()
+
+    def close(self):
+        pass
+
+
+class WerkzeugClient(HttpClient):
+    """Serve a Flask app from a threaded werkzeug server in this process."""
+
+    def __init__(self, flask_app, host="127.0.0.1"):
+        from werkzeug.serving import make_server
+        self.server = make_server(host, 0, flask_app, threaded=True)
+        super().__init__(f"http://{host}:{self.server.server_port}")
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class AsgiClient(HttpClient):
+    """
+    Run backend/asgi.py under uvicorn in a subprocess (cwd must hold ``models/``).
+
+    The socket is bound here (``port=0``: any free port) and handed to uvicorn with ``--fd``, so parallel
+    runs never collide and there is no gap between picking a port and binding it.
+    """
+
+    def __init__(self, workers, host="127.0.0.1", port=0, startup_timeout=120):
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT, SCORING_WORKERS=str(workers))
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, port))
+            port = sock.getsockname()[1]
+            self.proc = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "backend.asgi:app", "--fd", str(sock.fileno()),
+                 "--log-level", "warning"],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, pass_fds=[sock.fileno()])
+        super().__init__(f"http://{host}:{port}")
+        deadline = time.time() + startup_timeout
+        while True:
+            try:
+                with urllib.request.urlopen(self.base_url + "/", timeout=1):
+                    break
+            except OSError:
+                if self.proc.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("ASGI server failed to start")
+                time.sleep(0.2)
+
+    def server_rss_mb(self):
+        # Event-loop process plus every scoring worker
+        if psutil is None:
+            return None
+        root = psutil.Process(self.proc.pid)
+        return sum(p.memory_info().rss for p in [root] + root.children(recursive=True)) / 1e6
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait(timeout=30)
+
+
+# ----------------------
+# Load generation
+# ----------------------
+def run_scenario(client, endpoint, payloads, concurrency, n_requests, warmup, seed,
+                 background=None, background_concurrency=0):
+    """
+    Fire ``n_requests`` at ``endpoint`` from ``concurrency`` threads. If ``background`` is given, that
+    endpoint is hit continuously from ``background_concurrency`` extra threads while measuring, to see
+    how small requests behave next to heavy ones.
+    """
+    rng = random.Random(seed)
+    specs = [request_spec(endpoint, payloads, rng) for _ in range(warmup + n_requests)]
+
+    for spec in specs[:warmup]:
+        client.send(*spec)
+
+    def timed(spec):
+        t0 = time.perf_counter()
+        status = client.send(*spec)
+        return time.perf_counter() - t0, status
+
+    stop = threading.Event()
+
+    def background_loop(worker_seed):
+        bg_rng = random.Random(worker_seed)
+        while not stop.is_set():
+            client.send(*request_spec(background, payloads, bg_rng))
+
+    bg_threads = []
+    if background and background_concurrency:
+        bg_threads = [threading.Thread(target=background_loop, args=(seed + i,), daemon=True)
+                      for i in range(background_concurrency)]
+        for t in bg_threads:
+            t.start()
+
+    rss_before = client.server_rss_mb()
+    t_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, specs[warmup:]))
+        wall = time.perf_counter() - t_start
+        rss_after = client.server_rss_mb()
+    finally:
+        stop.set()
+        for t in bg_threads:
+            t.join()
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    errors = sum(1 for r in results if r[1] != 200)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "background": f"{background} x{background_concurrency}" if bg_threads else None,
+        "requests": n_requests,
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "rps": round(n_requests / wall, 2) if wall > 0 else None,
+        "latency_ms": {
+            "mean": round(float(latencies.mean()), 3),
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "max": round(float(latencies.max()), 3),
+        },
+        "rss_mb": {
+            "before": None if rss_before is None else round(rss_before, 1),
+            "after": None if rss_after is None else round(rss_after, 1),
+            "peak": round(peak_rss_mb(), 1),
+        },
+    }
+
+
+def make_clients(mode, modules, args):
+    if mode == "asgi":
+        # One ASGI app serves every endpoint
+        client = AsgiClient(args.asgi_workers, port=args.asgi_port)
+        return {name: client for name in APPS}
+    if mode == "inprocess":
+        return {name: InProcessClient(module.app) for name, module in modules.items()}
+    return {name: WerkzeugClient(module.app) for name, module in modules.items()}
+
+
+MODES = {
+    "inprocess": ["inprocess"],
+    "http": ["http"],
+    "asgi": ["asgi"],
+    "both": ["inprocess", "http"],
+    "all": ["inprocess", "http", "asgi"],
+}
+
+
+def run_benchmarks(args):
+    workdir = tempfile.mkdtemp(prefix="irm_bench_")
+    cwd = os.getcwd()
+    prepare_workdir(workdir, args.seed)
+    if not args.prediction_cache:
+        # predict_row bodies repeat (100 distinct rows): without this the run measures cache hits, not
+        # scoring, and stops being comparable with runs from before the cache. Set before the apps (and
+        # the ASGI subprocess, which inherits the environment) read it.
+        os.environ["PREDICTION_CACHE_ENTRIES"] = "0"
+    try:
+        needed = {ENDPOINTS[e] for e in args.endpoints}
+        if args.background:
+            needed.add(ENDPOINTS[args.background])
+        modules = {name: load_app(name) for name in needed}
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        payloads = build_payloads(args.csv_rows, args.seed)
+
+        results = []
+        for mode in MODES[args.mode]:
+            clients = make_clients(mode, modules, args)
+            try:
+                # get_chunk pages through the last upload, so seed one first
+                if "get_chunk" in args.endpoints or args.background == "get_chunk":
+                    clients["backend"].send(*request_spec("predict_csv", payloads, random.Random(0)))
+                for endpoint in args.endpoints:
+                    for conc in args.concurrency:
+                        res = run_scenario(clients[ENDPOINTS[endpoint]], endpoint, payloads,
+                                           conc, args.requests, args.warmup, args.seed,
+                                           args.background, args.background_concurrency)
+                        res["mode"] = mode
+                        results.append(res)
+                        print(format_row(res))
+            finally:
+                for client in set(clients.values()):
+                    client.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {
+                "endpoints": args.endpoints,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "csv_rows": args.csv_rows,
+                "seed": args.seed,
+                "background": args.background,
+                "background_concurrency": args.background_concurrency,
+                "asgi_workers": args.asgi_workers,
+                "prediction_cache": args.prediction_cache,
+            },
+        },
+        "results": results,
+    }
+
+
+# ----------------------
+# Reporting
+# ----------------------
+def format_row(res):
+    lat = res["latency_ms"]
+    return (f"{res['mode']:<9} {res['endpoint']:<12} c={res['concurrency']:<3} "
+            f"rps={res['rps']:<9} p50={lat['p50']:<9} p95={lat['p95']:<9} p99={lat['p99']:<9} "
+            f"err={res['errors']:<3} rss={res['rss_mb']['after']}MB"
+            + (f"  [bg {res['background']}]" if res["background"] else ""))
+
+
+def save_results(report, out_path=None):
+    if out_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = report["meta"]["timestamp"].replace(":", "").replace("-", "")
+        out_path = os.path.join(RESULTS_DIR, f"{stamp}_{report['meta']['commit']}.json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return out_path
+
+
+def compare_results(base_path, new_path):
+    """Print per-scenario rps and p95/p99 deltas between two saved runs."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def key(r):
+        return r["mode"], r["endpoint"], r["concurrency"], r.get("background")
+
+    base_idx = {key(r): r for r in base["results"]}
+    print(f"base={base['meta']['commit']}  new={new['meta']['commit']}")
+    cached = [run["meta"]["config"].get("prediction_cache", False) for run in (base, new)]
+    if cached[0] != cached[1]:
+        print(f"warning: prediction cache base={cached[0]} new={cached[1]}; predict_row numbers are not comparable")
+    for r in new["results"]:
+        b = base_idx.get(key(r))
+        if b is None:
+            continue
+        deltas = []
+        for label, old, cur in [("rps", b["rps"], r["rps"]),
+                                ("p95", b["latency_ms"]["p95"], r["latency_ms"]["p95"]),
+                                ("p99", b["latency_ms"]["p99"], r["latency_ms"]["p99"])]:
+            pct = (cur - old) / old * 100 if old else float("nan")
+            deltas.append(f"{label} {old} -> {cur} ({pct:+.1f}%)")
+        print(f"{r['mode']:<9} {r['endpoint']:<12} c={r['concurrency']:<3} " + "  ".join(deltas))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend prediction APIs.")
+    parser.add_argument("--mode", choices=list(MODES), default="both",
+                        help="both = inprocess + http; all also runs the ASGI server (backend/asgi.py)")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS),
+                        default=["predict_csv", "get_chunk", "predict_row"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--csv-rows", type=int, default=1000, help="rows in the uploaded CSV")
+    parser.add_argument("--background", choices=list(ENDPOINTS), default=None,
+                        help="endpoint to keep busy in the background while measuring")
+    parser.add_argument("--background-concurrency", type=int, default=2)
+    parser.add_argument("--asgi-workers", type=int, default=2, help="scoring pool size for --mode asgi")
+    parser.add_argument("--asgi-port", type=int, default=0, help="port for the ASGI server (default: any free port)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--prediction-cache", action="store_true",
+                        help="keep the prediction cache on to measure predict_row cache hits (off by default)")
+    parser.add_argument("--out", default=None, help="output JSON path (default: benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--verbose", action="store_true", help="keep the apps' INFO logging")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare_results(*args.compare)
+        return
+    report = run_benchmarks(args)
+    print(f"Results saved to {save_results(report, args.out)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+import joblib
+import warnings
+from scipy.sparse import hstack, csr_matrix
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from backend.model_config import MODEL_PATHS, CLAIM_DROP_COLS, SEVERITY_DROP_COLS, SEVERITY_TARGET
+
+# ----------------------
+# Processed schema (output of src.preprocess.clean_data)
+# ----------------------
+CATEGORY_VALUES = {
+    "LegalType": ["individual", "close corporation", "private company", "partnership"],
+    "Title": ["mr", "mrs", "ms", "miss", "dr"],
+    "Bank": ["first national bank", "absa bank", "standard bank", "nedbank", "capitec bank", "unknown"],
+    "AccountType": ["current account", "savings account", "transmission account", "unknown"],
+    "Gender": ["male", "female"],
+    "Country": ["south africa"],
+    "Province": ["gauteng", "western cape", "kwazulu-natal", "eastern cape", "mpumalanga",
+                 "limpopo", "north west", "free state", "northern cape"],
+    "MainCrestaZone": ["rand east", "cape town", "durban", "port elizabeth", "pretoria",
+                       "north west", "east london", "bloemfontein"],
+    "SubCrestaZone": ["rand east", "cape town", "durban", "port elizabeth", "pretoria",
+                      "north west", "east london", "bloemfontein", "karoo", "lowveld"],
+    "ItemType": ["mobility - motor"],
+    "VehicleType": ["passenger vehicle", "medium commercial", "heavy commercial", "light commercial", "bus"],
+    "make": ["toyota", "mercedes-benz", "volkswagen", "nissan", "ford", "hyundai", "isuzu"],
+    "Model": ["quantum 2.7 ses", "sprinter 515 cdi", "polo vivo 1.4", "np200 1.6", "ranger 2.2", "h-1 2.4", "kb 250"],
+    "bodytype": ["b/s", "s/d", "h/b", "p/v", "d/s"],
+    "AlarmImmobiliser": ["yes", "no"],
+    "TrackingDevice": ["yes", "no"],
+    "TermFrequency": ["monthly", "annual"],
+    "ExcessSelected": ["mobility - windscreen", "mobility - metered taxis - r2000", "no excess", "r2000"],
+    "CoverCategory": ["windscreen", "own damage", "third party", "passenger liability", "signage and vehicle wraps"],
+    "CoverType": ["windscreen", "own damage", "third party", "passenger liability", "signage and vehicle wraps"],
+    "CoverGroup": ["comprehensive - taxi", "motor comprehensive"],
+    "Section": ["motor comprehensive"],
+    "Product": ["mobility metered taxis: monthly", "mobility commercial cover: monthly"],
+    "StatutoryClass": ["commercial"],
+    "StatutoryRiskType": ["ifrs constant"],
+}
+
+BOOL_COLS = ["IsVATRegistered", "NewVehicle", "WrittenOff", "Rebuilt", "Converted"]
+
+PROCESSED_COLUMNS = [
+    "RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth", "IsVATRegistered",
+    "LegalType", "Title", "Bank", "AccountType", "Gender", "Country", "Province", "PostalCode",
+    "MainCrestaZone", "SubCrestaZone", "ItemType", "mmcode", "VehicleType", "RegistrationYear",
+    "make", "Model", "Cylinders", "cubiccapacity", "kilowatts", "bodytype", "NumberOfDoors",
+    "VehicleIntroDate", "AlarmImmobiliser", "TrackingDevice", "CapitalOutstanding", "NewVehicle",
+    "WrittenOff", "Rebuilt", "Converted", "SumInsured", "TermFrequency", "CalculatedPremiumPerTerm",
+    "ExcessSelected", "CoverCategory", "CoverType", "CoverGroup", "Section", "Product",
+    "StatutoryClass", "StatutoryRiskType", "TotalPremium", "TotalClaims"
+]
+
+
+def make_policy_rows(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Generate ``n_rows`` synthetic policy rows with the processed-data schema and dtypes."""
+    rng = np.random.default_rng(seed)
+    cols = {}
+
+    cols["RecordID"] = np.arange(n_rows)
+    cols["UnderwrittenCoverID"] = rng.integers(1, 300_000, n_rows)
+    cols["PolicyID"] = rng.integers(1, 25_000, n_rows)
+    months = pd.date_range("2013-10-01", "2015-08-01", freq="MS")
+    cols["TransactionMonth"] = months[rng.integers(0, len(months), n_rows)].strftime("%Y-%m-%d")
+    cols["PostalCode"] = rng.choice([1, 122, 299, 2000, 4001, 7100, 7405, 8000, 9300], n_rows)
+    cols["mmcode"] = rng.integers(4_000_000, 65_000_000, n_rows).astype(float)
+    cols["RegistrationYear"] = rng.integers(1987, 2016, n_rows)
+    cols["Cylinders"] = rng.choice([4.0, 6.0, 8.0], n_rows, p=[0.8, 0.15, 0.05])
+    cols["cubiccapacity"] = rng.choice([1399.0, 1598.0, 2494.0, 2693.0], n_rows)
+    cols["kilowatts"] = rng.choice([55.0, 75.0, 111.0, 151.0], n_rows)
+    cols["NumberOfDoors"] = rng.choice([3.0, 4.0, 5.0], n_rows)
+    intro = pd.date_range("1990-01-01", "2015-01-01", freq="MS")
+    cols["VehicleIntroDate"] = intro[rng.integers(0, len(intro), n_rows)].strftime("%Y-%m-%d")
+    cols["CapitalOutstanding"] = np.round(rng.lognormal(11, 1.2, n_rows), 2)
+    cols["SumInsured"] = np.round(rng.lognormal(11.5, 1.5, n_rows), 2)
+    cols["CalculatedPremiumPerTerm"] = np.round(rng.lognormal(4, 1.2, n_rows), 4)
+    cols["TotalPremium"] = np.round(cols["CalculatedPremiumPerTerm"] * rng.uniform(0, 1.2, n_rows), 6)
+    # Claim rate is inflated relative to the real book (~0.3%) so small stand-in fits see positives
+    has_claim = rng.random(n_rows) < 0.03
+    cols["TotalClaims"] = np.where(has_claim, np.round(rng.lognormal(9, 1.5, n_rows), 2), 0.0)
+
+    for col, values in CATEGORY_VALUES.items():
+        cols[col] = rng.choice(values, n_rows)
+    for col in BOOL_COLS:
+        cols[col] = rng.random(n_rows) < 0.1
+
+    return pd.DataFrame(cols)[PROCESSED_COLUMNS]
+
+
+def _claim_matrix(df):
+    # Mirrors preprocess_claim_data in the backend so the stand-in scaler/encoder line up exactly
+    X = df.drop(columns=CLAIM_DROP_COLS)
+    num_cols = X.select_dtypes(include=[np.number]).columns.tolist()
+    cat_cols = X.select_dtypes(include=["object", "bool", "category"]).columns.tolist()
+    ohe = OneHotEncoder(handle_unknown="ignore", sparse_output=True)
+    X_cat = ohe.fit_transform(X[cat_cols].fillna("__NA__").astype(str))
+    return hstack([csr_matrix(X[num_cols].fillna(0)), X_cat]).tocsr(), ohe
+
+
+def _tree_pipeline(X, seed):
+    num_cols = X.select_dtypes(include=[np.number]).columns.tolist()
+    cat_cols = X.select_dtypes(include=["object", "bool", "category"]).columns.tolist()
+    preprocessor = ColumnTransformer([
+        ("num", "passthrough", num_cols),
+        ("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), cat_cols)
+    ])
+    return Pipeline([
+        ("preprocessor", preprocessor),
+        ("regressor", RandomForestRegressor(n_estimators=20, max_depth=8, min_samples_leaf=5,
+                                            random_state=seed, n_jobs=1))
+    ])
+
+
+def write_stand_in_models(model_dir: str = "models", n_rows: int = 5000, seed: int = 42) -> dict:
+    """
+    Fit small stand-in versions of the three production models on synthetic rows and save them
+    under the file names the backends load (``MODEL_PATHS``). Returns a mapping of artifact name to path.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    df = make_policy_rows(n_rows, seed)
+    # Round-trip through CSV so dtypes match what the API sees from an upload
+    df = pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+    # Claim occurrence: OHE + scaler + logistic regression (sparse), as in the training notebook
+    X_claim, ohe = _claim_matrix(df)
+    scaler = StandardScaler(with_mean=False)
+    X_claim = scaler.fit_transform(X_claim)
+    claim_model = LogisticRegression(max_iter=200, class_weight="balanced", random_state=seed)
+    with warnings.catch_warnings():
+        # Convergence is irrelevant for a stand-in; only the artifact shape matters
+        warnings.simplefilter("ignore")
+        claim_model.fit(X_claim, (df["TotalClaims"] > 0).astype(int))
+
+    # Claim severity: tree pipeline on the columns the backend keeps
+    X_sev = df.drop(columns=SEVERITY_DROP_COLS + [SEVERITY_TARGET])
+    severity_model = _tree_pipeline(X_sev, seed)
+    severity_model.fit(X_sev, df[SEVERITY_TARGET])
+
+    # Premium: tree pipeline, same drops as the "fast" premium notebook cell
+    premium_drop = ["RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth", "VehicleIntroDate",
+                    "CapitalOutstanding", "SumInsured", "TotalPremium"]
+    X_prem = df.drop(columns=premium_drop + ["CalculatedPremiumPerTerm", "TotalClaims"])
+    premium_model = _tree_pipeline(X_prem, seed)
+    premium_model.fit(X_prem, df["CalculatedPremiumPerTerm"])
+
+    artifacts = {
+        "claim_model": claim_model,
+        "claim_scaler": scaler,
+        "claim_ohe": ohe,
+        "severity_model": severity_model,
+        "premium_model": premium_model,
+    }
+    paths = {}
+    for name, obj in artifacts.items():
+        paths[name] = os.path.join(model_dir, os.path.basename(MODEL_PATHS[name]))
+        joblib.dump(obj, paths[name])
+    return paths
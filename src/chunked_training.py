@@ -0,0 +1,466 @@
+"""
+Out-of-core training of the claim, severity and premium models on the full processed dataset.
+
+The processed CSV is streamed in chunks and never held in memory as a whole:
+
+1. vocabulary pass: fit a schema-locked ``InputEncoder`` per model (category counts are accumulated
+   chunk by chunk, so the full book defines the vocabularies);
+2. statistics pass: ``StandardScaler.partial_fit`` on the numeric columns of each chunk plus target/class
+   counts (with ``class_weight="balanced"`` the class counts give balanced sample weights for the claim
+   model instead of SMOTE; the intercept is shifted back afterwards so probabilities stay calibrated);
+3. ``epochs`` training passes: ``partial_fit`` of averaged SGD estimators on every chunk's training rows;
+4. evaluation pass: streaming RMSE/MAE/R2 and log loss/precision/recall/F1/ROC AUC/calibration error on
+   the held-out rows.
+
+Rows are assigned to the hold-out set by a hash of their position in the file, so the split does not
+depend on the chunk size. Artifacts are written to ``models/`` with a version suffix together with a
+JSON manifest recording metrics, fit time and peak memory.
+
+Usage (from the repo root):
+    python -m src.chunked_training --data data/processed/processed_insurance_data.csv --chunksize 200000
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from scipy import sparse
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.model_config import CLAIM_DROP_COLS, SEVERITY_DROP_COLS, SEVERITY_TARGET
+from utils.preprocess_input import InputEncoder
+from src.preprocess import PROCESSED_DATA_PATH
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+MODEL_DIR = "models"
+
+# Averaged SGD with a constant step: the average of the iterates converges without the huge early steps of
+# the "optimal" schedule, which saturated the claim model's probabilities
+SGD_PARAMS = {"alpha": 1e-4, "learning_rate": "constant", "eta0": 0.01, "average": True}
+
+# ----------------------
+# Model specifications (targets and drops follow notebooks/modeling.ipynb)
+# ----------------------
+PREMIUM_TARGET = "CalculatedPremiumPerTerm"
+PREMIUM_TRAIN_DROP_COLS = ["RecordID", "UnderwrittenCoverID", "PolicyID", "TransactionMonth", "VehicleIntroDate",
+                           "CapitalOutstanding", "SumInsured", "TotalPremium", "TotalClaims"]
+
+MODEL_SPECS = {
+    "claim": {
+        "task": "classification",
+        "target": "TotalClaims",
+        "drop": CLAIM_DROP_COLS,
+        "rows": None,
+    },
+    "severity": {
+        "task": "regression",
+        "target": SEVERITY_TARGET,
+        "drop": SEVERITY_DROP_COLS,
+        "rows": lambda df: df[SEVERITY_TARGET] > 0,
+    },
+    "premium": {
+        "task": "regression",
+        "target": PREMIUM_TARGET,
+        "drop": PREMIUM_TRAIN_DROP_COLS,
+        "rows": None,
+    },
+}
+
+
+def peak_memory_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def iter_chunks(path, chunksize):
+    return pd.read_csv(path, chunksize=chunksize, low_memory=False)
+
+
+def holdout_mask(chunk, test_size):
+    # Multiplicative hash of the global row number: stable for any chunk size
+    row = chunk.index.to_numpy(dtype=np.uint64)
+    return (row * np.uint64(2654435761)) % np.uint64(2 ** 32) % np.uint64(1000) < np.uint64(test_size * 1000)
+
+
+def scale_numeric(X, scaler, n_numeric):
+    """Standardize the leading numeric block of an encoded CSR matrix; one-hot columns stay 0/1."""
+    numeric = X[:, :n_numeric].toarray()
+    if scaler is not None:
+        numeric = scaler.transform(numeric)
+    # Missing numerics score as the mean (0 after scaling)
+    numeric = np.nan_to_num(numeric)
+    return sparse.hstack([sparse.csr_matrix(numeric), X[:, n_numeric:]], format="csr")
+
+
+# ----------------------
+# Saved artifact
+# ----------------------
+class ChunkedModel:
+    """Encoder, numeric scaler and incremental estimator saved as one artifact that scores a DataFrame."""
+
+    def __init__(self, encoder, scaler, estimator, target_mean=0.0, target_scale=1.0):
+        self.encoder = encoder
+        self.scaler = scaler
+        self.estimator = estimator
+        self.target_mean = target_mean
+        self.target_scale = target_scale
+
+    @property
+    def feature_names_in_(self):
+        return np.array(self.encoder.numeric_cols_ + list(self.encoder.bool_maps) + self.encoder.categorical_cols)
+
+    def _features(self, df):
+        return scale_numeric(self.encoder.transform(df), self.scaler, len(self.encoder.numeric_cols_))
+
+    def predict(self, df):
+        pred = self.estimator.predict(self._features(df))
+        if isinstance(self.estimator, SGDClassifier):
+            return pred
+        return pred * self.target_scale + self.target_mean
+
+    def predict_proba(self, df):
+        return self.estimator.predict_proba(self._features(df))
+
+
+# ----------------------
+# Streaming metrics
+# ----------------------
+class RegressionMetrics:
+    def __init__(self):
+        self.n = 0
+        self.sse = 0.0
+        self.sae = 0.0
+        self.sum_y = 0.0
+        self.sum_y2 = 0.0
+
+    def update(self, y_true, y_pred):
+        err = y_true - y_pred
+        self.n += len(y_true)
+        self.sse += float(err @ err)
+        self.sae += float(np.abs(err).sum())
+        self.sum_y += float(y_true.sum())
+        self.sum_y2 += float(y_true @ y_true)
+
+    def result(self):
+        if self.n == 0:
+            return {"n": 0}
+        sst = self.sum_y2 - self.sum_y ** 2 / self.n
+        return {
+            "n": self.n,
+            "rmse": float(np.sqrt(self.sse / self.n)),
+            "mae": self.sae / self.n,
+            "r2": 1 - self.sse / sst if sst > 0 else None,
+        }
+
+
+class ClassificationMetrics:
+    """Confusion counts at ``threshold``, mean log loss and ROC AUC from fixed-width score histograms."""
+
+    def __init__(self, threshold=0.5, bins=1000):
+        self.threshold = threshold
+        self.bins = bins
+        self.pos_hist = np.zeros(bins, dtype=np.int64)
+        self.neg_hist = np.zeros(bins, dtype=np.int64)
+        self.proba_sum = np.zeros(bins)
+        self.tp = self.fp = self.tn = self.fn = 0
+        self.log_loss_sum = 0.0
+
+    def update(self, y_true, proba):
+        y_true = y_true.astype(bool)
+        pred = proba >= self.threshold
+        self.tp += int((pred & y_true).sum())
+        self.fp += int((pred & ~y_true).sum())
+        self.tn += int((~pred & ~y_true).sum())
+        self.fn += int((~pred & y_true).sum())
+        p = np.clip(proba, 1e-15, 1 - 1e-15)
+        self.log_loss_sum -= float(np.where(y_true, np.log(p), np.log(1 - p)).sum())
+        idx = np.minimum((proba * self.bins).astype(int), self.bins - 1)
+        self.pos_hist += np.bincount(idx[y_true], minlength=self.bins)
+        self.neg_hist += np.bincount(idx[~y_true], minlength=self.bins)
+        self.proba_sum += np.bincount(idx, weights=proba, minlength=self.bins)
+
+    def roc_auc(self):
+        n_pos, n_neg = self.pos_hist.sum(), self.neg_hist.sum()
+        if n_pos == 0 or n_neg == 0:
+            return None
+        # P(score_pos > score_neg) + 0.5 * P(tie), ties being scores in the same bin
+        neg_below = np.cumsum(self.neg_hist) - self.neg_hist
+        return float((self.pos_hist * (neg_below + 0.5 * self.neg_hist)).sum() / (n_pos * n_neg))
+
+    def calibration_error(self, n_bins=10):
+        """Expected calibration error: count-weighted |mean probability - positive rate| over ``n_bins`` bins."""
+        group = lambda a: a.reshape(n_bins, -1).sum(axis=1)
+        pos, count, proba = group(self.pos_hist), group(self.pos_hist + self.neg_hist), group(self.proba_sum)
+        filled = count > 0
+        return float(np.abs(proba[filled] - pos[filled]).sum() / count.sum())
+
+    def result(self):
+        n = self.tp + self.fp + self.tn + self.fn
+        if n == 0:
+            return {"n": 0}
+        precision = self.tp / (self.tp + self.fp) if self.tp + self.fp else 0.0
+        recall = self.tp / (self.tp + self.fn) if self.tp + self.fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return {
+            "n": n,
+            "accuracy": (self.tp + self.tn) / n,
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+            "log_loss": self.log_loss_sum / n,
+            "roc_auc": self.roc_auc(),
+            "threshold": self.threshold,
+            "mean_proba": float(self.proba_sum.sum() / n),
+            "positive_rate": (self.tp + self.fn) / n,
+            "calibration_error": self.calibration_error(),
+        }
+
+
+# ----------------------
+# Per-model incremental trainer
+# ----------------------
+class IncrementalTrainer:
+    def __init__(self, name, spec, max_categories=50, random_state=42, sgd_params=None, class_weight=None):
+        self.name = name
+        self.spec = spec
+        self.max_categories = max_categories
+        self.classification = spec["task"] == "classification"
+        self.class_weight = class_weight
+        self.encoder = None
+        self.scaler = StandardScaler()
+        params = {**SGD_PARAMS, **(sgd_params or {})}
+        if self.classification:
+            self.estimator = SGDClassifier(loss="log_loss", random_state=random_state, **params)
+        else:
+            self.estimator = SGDRegressor(random_state=random_state, **params)
+        self.class_counts = np.zeros(2, dtype=np.int64)
+        self.target_count = 0
+        self.target_sum = 0.0
+        self.target_sum2 = 0.0
+        self.target_mean = 0.0
+        self.target_scale = 1.0
+        self.fit_seconds = 0.0
+        self.train_rows = 0
+
+    def _split(self, chunk):
+        spec = self.spec
+        if spec["target"] not in chunk.columns:
+            raise KeyError(f"{self.name}: target column {spec['target']!r} not in data")
+        if spec["rows"] is not None:
+            chunk = chunk[spec["rows"](chunk)]
+        y = chunk[spec["target"]].to_numpy(dtype=np.float64, na_value=np.nan)
+        keep = ~np.isnan(y)
+        X = chunk.drop(columns=[c for c in spec["drop"] + [spec["target"]] if c in chunk.columns])
+        X, y = X[keep], y[keep]
+        if self.classification:
+            y = (y > 0).astype(np.int64)
+        return X, y
+
+    # Pass 1
+    def update_vocabulary(self, chunk):
+        X, _ = self._split(chunk)
+        if self.encoder is None:
+            # Roles are fixed from the first chunk; bools and strings are one-hot encoded
+            cat_cols = X.select_dtypes(include=["object", "bool", "category", "string"]).columns.tolist()
+            # Dropped columns and the target are ignored, so the saved model also scores full policy rows
+            self.encoder = InputEncoder(categorical_cols=cat_cols, bool_maps={}, max_categories=self.max_categories,
+                                        ignore_cols=self.spec["drop"] + [self.spec["target"]])
+        self.encoder.partial_fit(X)
+
+    # Pass 2
+    def update_statistics(self, chunk, train):
+        X, y = self._split(chunk[train])
+        if len(y) == 0:
+            return
+        self.scaler.partial_fit(self.encoder.transform(X)[:, :len(self.encoder.numeric_cols_)].toarray())
+        if self.classification:
+            self.class_counts += np.bincount(y, minlength=2)
+        else:
+            self.target_count += len(y)
+            self.target_sum += float(y.sum())
+            self.target_sum2 += float(y @ y)
+
+    def class_weights(self):
+        if self.class_weight != "balanced":
+            return np.ones(2)
+        weights = self.class_counts.sum() / (2 * np.maximum(self.class_counts, 1))
+        # Scaled so the rare class gets weight 1: a weighted row never takes a step larger than eta0
+        return weights / weights.max()
+
+    def finish_statistics(self):
+        if self.classification and self.class_weight == "balanced":
+            # Weights were scaled down by the rare class's balanced weight; scale alpha with them so the
+            # penalty keeps its strength relative to the (mean-one) balanced loss
+            balanced_max = (self.class_counts.sum() / (2 * np.maximum(self.class_counts, 1))).max()
+            self.estimator.set_params(alpha=self.estimator.alpha / balanced_max)
+        if not self.classification and self.target_count:
+            self.target_mean = self.target_sum / self.target_count
+            var = self.target_sum2 / self.target_count - self.target_mean ** 2
+            self.target_scale = float(np.sqrt(var)) if var > 0 else 1.0
+
+    # Passes 3..
+    def train_chunk(self, chunk, train, rng):
+        X, y = self._split(chunk[train])
+        if len(y) == 0:
+            return
+        order = rng.permutation(len(y))
+        Xs = self.model()._features(X.iloc[order])
+        y = y[order]
+        start = time.perf_counter()
+        if self.classification:
+            self.estimator.partial_fit(Xs, y, classes=np.array([0, 1]), sample_weight=self.class_weights()[y])
+        else:
+            self.estimator.partial_fit(Xs, (y - self.target_mean) / self.target_scale)
+        self.fit_seconds += time.perf_counter() - start
+        self.train_rows += len(y)
+
+    def finish_training(self):
+        if self.classification and self.class_weight == "balanced":
+            # Reweighting classes shifts the log-odds by log(w1 / w0); undo it so probabilities are calibrated
+            weights = self.class_weights()
+            self.estimator.intercept_ = self.estimator.intercept_ - np.log(weights[1] / weights[0])
+
+    def positive_rate(self):
+        return float(self.class_counts[1] / max(self.class_counts.sum(), 1))
+
+    def model(self):
+        return ChunkedModel(self.encoder, self.scaler, self.estimator, self.target_mean, self.target_scale)
+
+    # Final pass
+    def evaluate_chunk(self, model, metrics, chunk, test):
+        X, y = self._split(chunk[test])
+        if len(y) == 0:
+            return
+        if self.classification:
+            metrics.update(y, model.predict_proba(X)[:, 1])
+        else:
+            metrics.update(y, model.predict(X))
+
+
+# ----------------------
+# Orchestration
+# ----------------------
+def train_chunked(data_path=PROCESSED_DATA_PATH, model_dir=MODEL_DIR, models=tuple(MODEL_SPECS),
+                  chunksize=200_000, epochs=3, test_size=0.2, max_categories=50, random_state=42,
+                  sgd_params=None, class_weight=None):
+    """Train the requested models on ``data_path`` chunk by chunk and write versioned artifacts; returns the manifest."""
+    start_all = time.perf_counter()
+    rng = np.random.default_rng(random_state)
+    sgd_params = {**SGD_PARAMS, **(sgd_params or {})}
+    trainers = {name: IncrementalTrainer(name, MODEL_SPECS[name], max_categories, random_state, sgd_params,
+                                         class_weight)
+                for name in models}
+
+    def run_pass(label, fn):
+        t0 = time.perf_counter()
+        rows = 0
+        for chunk in iter_chunks(data_path, chunksize):
+            test = holdout_mask(chunk, test_size)
+            for trainer in trainers.values():
+                fn(trainer, chunk, test)
+            rows += len(chunk)
+        logging.info(f"{label}: {rows} rows in {time.perf_counter() - t0:.1f}s, "
+                     f"peak memory {peak_memory_mb():.0f} MB")
+        return rows
+
+    total_rows = run_pass("Vocabulary pass", lambda t, chunk, test: t.update_vocabulary(chunk[~test]))
+    run_pass("Statistics pass", lambda t, chunk, test: t.update_statistics(chunk, ~test))
+    for trainer in trainers.values():
+        trainer.finish_statistics()
+    for epoch in range(epochs):
+        run_pass(f"Training epoch {epoch + 1}/{epochs}", lambda t, chunk, test: t.train_chunk(chunk, ~test, rng))
+
+    for trainer in trainers.values():
+        trainer.finish_training()
+
+    fitted = {name: trainer.model() for name, trainer in trainers.items()}
+    # Calibrated claim probabilities are small: flag rows above the training claim rate
+    metrics = {name: ClassificationMetrics(threshold=trainer.positive_rate()) if trainer.classification
+               else RegressionMetrics()
+               for name, trainer in trainers.items()}
+    run_pass("Evaluation pass", lambda t, chunk, test: t.evaluate_chunk(fitted[t.name], metrics[t.name], chunk, test))
+
+    # ----------------------
+    # Save versioned artifacts
+    # ----------------------
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    os.makedirs(model_dir, exist_ok=True)
+    manifest = {
+        "version": version,
+        "data_path": data_path,
+        "total_rows": total_rows,
+        "config": {"chunksize": chunksize, "epochs": epochs, "test_size": test_size,
+                   "max_categories": max_categories, "random_state": random_state,
+                   "sgd_params": sgd_params, "class_weight": class_weight},
+        "models": {},
+    }
+    for name, trainer in trainers.items():
+        path = os.path.join(model_dir, f"sgd_{name}_model_chunked_{version}.pkl")
+        joblib.dump(fitted[name], path)
+        manifest["models"][name] = {
+            "path": path,
+            "estimator": type(trainer.estimator).__name__,
+            "target": trainer.spec["target"],
+            "n_features": trainer.encoder.n_features_,
+            "train_rows_seen": trainer.train_rows,
+            "fit_seconds": round(trainer.fit_seconds, 3),
+            "metrics": metrics[name].result(),
+        }
+        logging.info(f"{name}: saved {path}; test metrics {manifest['models'][name]['metrics']}")
+    manifest["total_seconds"] = round(time.perf_counter() - start_all, 3)
+    manifest["peak_memory_mb"] = round(peak_memory_mb(), 1)
+
+    manifest_path = os.path.join(model_dir, f"training_manifest_{version}.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    logging.info(f"Manifest written to {manifest_path} (total {manifest['total_seconds']}s, "
+                 f"peak memory {manifest['peak_memory_mb']} MB)")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunked out-of-core training of the claim/severity/premium models")
+    parser.add_argument("--data", default=PROCESSED_DATA_PATH)
+    parser.add_argument("--out", default=MODEL_DIR)
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_SPECS), default=list(MODEL_SPECS))
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--max-categories", type=int, default=50,
+                        help="Most frequent values kept per categorical column; the rest share an unknown bucket")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--alpha", type=float, default=SGD_PARAMS["alpha"], help="L2 regularisation strength")
+    parser.add_argument("--learning-rate", default=SGD_PARAMS["learning_rate"],
+                        choices=["constant", "optimal", "invscaling", "adaptive"])
+    parser.add_argument("--eta0", type=float, default=SGD_PARAMS["eta0"], help="Initial/constant step size")
+    parser.add_argument("--no-average", dest="average", action="store_false",
+                        help="Use the last SGD iterate instead of the averaged weights")
+    parser.add_argument("--class-weight", choices=["balanced"], default=None,
+                        help="Reweight claim/no-claim rows in training (probabilities are corrected back)")
+    args = parser.parse_args(argv)
+
+    # Import by module path: run as `python -m`, this file is __main__, and ChunkedModel would be pickled
+    # as __main__.ChunkedModel, which nothing else can load
+    from src.chunked_training import train_chunked
+    sgd_params = {"alpha": args.alpha, "learning_rate": args.learning_rate, "eta0": args.eta0,
+                  "average": args.average}
+    train_chunked(args.data, args.out, args.models, args.chunksize, args.epochs,
+                  args.test_size, args.max_categories, args.seed, sgd_params, args.class_weight)
+
+
+if __name__ == "__main__":
+    main()
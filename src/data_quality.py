@@ -0,0 +1,253 @@
+"""
+Data-quality profiling of raw policy extracts (the checks in ``notebooks/import_clean.ipynb``) in one
+chunked pass over the file.
+
+Every column is read as text and, per chunk, with vectorized string operations:
+
+- missing values (pandas' default NA markers, i.e. what ``df.isnull()`` counts after a normal read);
+- placeholder values (stripped value in ``PLACEHOLDERS``, the notebook's "empty-like" list);
+- value kinds (numeric, boolean, date, text) for mixed-type detection, replacing ``apply(type)``;
+- constant columns (at most one distinct non-missing value).
+
+Duplicate rows are found from 64-bit row fingerprints (``pd.util.hash_pandas_object``), so only eight
+bytes per row are kept across chunks. The report is a plain dict (saved as JSON) whose
+``recommended_drops`` ``clean_data`` consumes once the extract has passed a baseline check. Given a baseline
+report, ``profile_file`` raises ``QualityDriftError`` when the extract drifts past the thresholds. Schema
+changes fail on the header and a column that starts mixing types fails on the chunk where it does; both can
+only get worse as more rows are read. Missing/placeholder/duplicate rates are only compared on the whole
+extract, since a partial read of an unchanged file can be far from its overall rates.
+
+Usage (from the repo root):
+    python -m src.data_quality --data data/raw/insurance_data.txt --baseline reports/data_quality/baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+QUALITY_REPORT_PATH = "reports/data_quality/latest.json"
+QUALITY_BASELINE_PATH = "reports/data_quality/baseline.json"
+
+# Placeholder strings often used to mean "missing" (after stripping whitespace)
+PLACEHOLDERS = ["", "nan", "NaN", "NULL", "-", ".", "N/A"]
+# What pandas reads as NaN by default
+NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+             "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+BOOL_VALUES = ["true", "false", "yes", "no"]
+DATE_PATTERN = r"\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?|\d{1,2}/\d{4}|\d{1,2}/\d{1,2}/\d{2,4}"
+KINDS = ["numeric", "boolean", "date", "text"]
+
+# A column is recommended for dropping when this share of its values is missing or placeholder
+# (the notebook dropped CustomValueEstimate at ~78% and kept the risk flags at ~64%)
+DROP_MISSING_THRESHOLD = 0.7
+
+DEFAULT_THRESHOLDS = {
+    "missing_percent_increase": 5.0,      # percentage points per column
+    "placeholder_percent_increase": 5.0,  # percentage points per column
+    "duplicate_percent_increase": 1.0,    # percentage points
+    "allow_new_mixed_types": False,
+    "allow_schema_change": False,
+}
+
+
+class QualityDriftError(ValueError):
+    def __init__(self, violations):
+        self.violations = violations
+        super().__init__("Data quality drifted past thresholds: " + "; ".join(violations))
+
+
+# ----------------------
+# Per-column accumulator
+# ----------------------
+class ColumnProfile:
+    def __init__(self):
+        self.count = 0
+        self.missing = 0
+        self.placeholder = 0
+        self.kinds = dict.fromkeys(KINDS, 0)
+        self.samples = set()  # up to two distinct non-missing values, for constant detection
+
+    def update(self, s):
+        stripped = s.str.strip()
+        missing = s.isin(NA_VALUES).to_numpy()
+        self.count += len(s)
+        self.missing += int(missing.sum())
+        self.placeholder += int(stripped.isin(PLACEHOLDERS).sum())
+
+        present = stripped[~missing & (stripped != "")]
+        if present.empty:
+            return
+        numeric = pd.to_numeric(present, errors="coerce").notna().to_numpy()
+        boolean = present.str.lower().isin(BOOL_VALUES).to_numpy() & ~numeric
+        date = present.str.fullmatch(DATE_PATTERN).to_numpy(dtype=bool) & ~numeric
+        text = ~(numeric | boolean | date)
+        for kind, mask in zip(KINDS, (numeric, boolean, date, text)):
+            self.kinds[kind] += int(mask.sum())
+        if len(self.samples) < 2:
+            self.samples.update(present.drop_duplicates().head(2).tolist())
+
+    def report(self):
+        n = max(self.count, 1)
+        observed = {k: c for k, c in self.kinds.items() if c}
+        return {
+            "missing_count": self.missing,
+            "missing_percent": round(100 * self.missing / n, 4),
+            "placeholder_count": self.placeholder,
+            "placeholder_percent": round(100 * self.placeholder / n, 4),
+            "kinds": observed,
+            "dominant_type": max(observed, key=observed.get) if observed else None,
+            "mixed_types": len(observed) > 1,
+            "constant": len(self.samples) <= 1,
+        }
+
+
+# ----------------------
+# Report
+# ----------------------
+def build_report(source, profiles, duplicates, n_rows, drop_threshold=DROP_MISSING_THRESHOLD, drift_checked=False):
+    columns = {col: p.report() for col, p in profiles.items()}
+    drops = [col for col, c in columns.items()
+             if max(c["missing_percent"], c["placeholder_percent"]) >= 100 * drop_threshold]
+    return {
+        "source": source,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "rows": n_rows,
+        "columns": columns,
+        "duplicate_rows": duplicates,
+        "duplicate_percent": round(100 * duplicates / max(n_rows, 1), 4),
+        "mixed_type_columns": [col for col, c in columns.items() if c["mixed_types"]],
+        # Reported only: constant columns such as Country are still part of the trained models' schema
+        "constant_columns": [col for col, c in columns.items() if c["constant"]],
+        "recommended_drops": drops,
+        # True only when the whole extract passed check_drift against a baseline; clean_data acts on
+        # recommended_drops only then
+        "drift_checked": drift_checked,
+    }
+
+
+def schema_violations(columns, baseline):
+    violations = []
+    missing = [c for c in baseline["columns"] if c not in columns]
+    added = [c for c in columns if c not in baseline["columns"]]
+    if missing:
+        violations.append(f"columns missing from extract: {missing}")
+    if added:
+        violations.append(f"unexpected new columns: {added}")
+    return violations
+
+
+def mixed_type_violations(columns, baseline):
+    """Columns (reports) that mix types when they did not in ``baseline``."""
+    base_cols = baseline["columns"]
+    return [f"{col}: now has mixed types {c['kinds']}" for col, c in columns.items()
+            if c["mixed_types"] and col in base_cols and not base_cols[col]["mixed_types"]]
+
+
+def check_drift(report, baseline, thresholds=None):
+    """Violations (list of messages) of ``report`` against ``baseline``; empty when within thresholds."""
+    t = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    base_cols, new_cols = baseline["columns"], report["columns"]
+    violations = [] if t["allow_schema_change"] else schema_violations(new_cols, baseline)
+    for col, c in new_cols.items():
+        b = base_cols.get(col)
+        if b is None:
+            continue
+        for key in ("missing_percent", "placeholder_percent"):
+            if c[key] - b[key] > t[f"{key}_increase"]:
+                violations.append(f"{col}: {key} {b[key]:.2f} -> {c[key]:.2f}")
+    if not t["allow_new_mixed_types"]:
+        violations += mixed_type_violations(new_cols, baseline)
+    if report["duplicate_percent"] - baseline["duplicate_percent"] > t["duplicate_percent_increase"]:
+        violations.append(f"duplicate rows {baseline['duplicate_percent']:.2f}% -> {report['duplicate_percent']:.2f}%")
+    return violations
+
+
+def profile_file(path, sep="|", chunksize=200_000, baseline=None, thresholds=None,
+                 drop_threshold=DROP_MISSING_THRESHOLD):
+    """
+    Profile ``path`` chunk by chunk and return the quality report. With ``baseline`` (a previous report),
+    raise ``QualityDriftError`` early on checks that more rows can't undo (schema, new mixed types) and on
+    the full ``check_drift`` of the whole extract before returning.
+    """
+    t = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    profiles, n_rows, duplicates = {}, 0, 0
+    seen = np.empty(0, dtype=np.uint64)  # sorted unique row fingerprints so far
+    reader = pd.read_csv(path, sep=sep, dtype=str, keep_default_na=False, chunksize=chunksize,
+                         on_bad_lines="skip", encoding="utf-8")
+    for i, chunk in enumerate(reader):
+        if i == 0 and baseline is not None and not t["allow_schema_change"]:
+            # Schema drift is known from the header: fail before reading the rest of the file
+            violations = schema_violations(list(chunk.columns), baseline)
+            if violations:
+                raise QualityDriftError(violations)
+        for col in chunk.columns:
+            profiles.setdefault(col, ColumnProfile()).update(chunk[col])
+        fingerprints = np.unique(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+        duplicates += len(chunk) - len(fingerprints) + int(np.isin(fingerprints, seen, assume_unique=True).sum())
+        seen = np.union1d(seen, fingerprints)
+        n_rows += len(chunk)
+
+        if baseline is not None and not t["allow_new_mixed_types"]:
+            # Once a column has seen two kinds of value it stays mixed, so this can't be a false alarm
+            violations = mixed_type_violations({col: profiles[col].report() for col in chunk.columns}, baseline)
+            if violations:
+                raise QualityDriftError(violations)
+        logging.info(f"Profiled {n_rows} rows")
+
+    report = build_report(path, profiles, duplicates, n_rows, drop_threshold, drift_checked=baseline is not None)
+    if baseline is not None:
+        violations = check_drift(report, baseline, thresholds)
+        if violations:
+            raise QualityDriftError(violations)
+    return report
+
+
+def save_report(report, path=QUALITY_REPORT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Data quality report saved to {path}")
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def missing_table(report):
+    """The notebook's missing-value table (count and percent per column, most missing first)."""
+    table = pd.DataFrame(report["columns"]).T[["missing_count", "missing_percent",
+                                               "placeholder_count", "placeholder_percent"]]
+    return table.sort_values("missing_count", ascending=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile a raw policy extract in one chunked pass")
+    parser.add_argument("--data", default="data/raw/insurance_data.txt")
+    parser.add_argument("--sep", default="|")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--baseline", default=None, help="Previous report to check drift against")
+    parser.add_argument("--out", default=QUALITY_REPORT_PATH)
+    args = parser.parse_args(argv)
+
+    baseline = load_report(args.baseline) if args.baseline else None
+    report = profile_file(args.data, args.sep, args.chunksize, baseline)
+    save_report(report, args.out)
+    print(missing_table(report).head(15).to_string())
+    print("Mixed-type columns:", report["mixed_type_columns"])
+    print(f"Duplicate rows: {report['duplicate_rows']} ({report['duplicate_percent']}%)")
+    print("Constant columns:", report["constant_columns"])
+    print("Recommended drops:", report["recommended_drops"])
+
+
+if __name__ == "__main__":
+    main()
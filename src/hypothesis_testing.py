@@ -0,0 +1,329 @@
+"""
+Batch hypothesis testing for risk segmentation (the study in ``notebooks/testing.ipynb``, for every
+segment column at once).
+
+The KPIs are derived once:
+
+- ``ClaimOccurred``: 1 if ``TotalClaims > 0`` else 0 (claim frequency)
+- ``ClaimSeverity``: ``TotalClaims`` where a claim occurred, NaN otherwise
+- ``Margin``: ``TotalPremium - TotalClaims``
+
+Each segment column is grouped once into per-group sufficient statistics (count, claims, mean, variance).
+From those, every test is a vectorized array expression: an omnibus chi-squared (frequency) or one-way
+ANOVA (severity, margin) per segment, and for every pair of groups a 2x2 chi-squared or a Welch t-test.
+Mann-Whitney U, which needs ranks, is computed pairwise from each group's sorted values. P-values are
+corrected across the whole run (Benjamini-Hochberg by default). Optional permutation tests of the
+between-group sum of squares run in a process pool.
+
+Usage (from the repo root):
+    python -m src.hypothesis_testing --data data/cleaned_machineLearningRating.csv --permutations 999
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+DEFAULT_SEGMENTS = [
+    "Province", "PostalCode", "MainCrestaZone", "SubCrestaZone", "Gender", "TrackingDevice",
+    "AlarmImmobiliser", "NewVehicle", "VehicleType", "CoverType", "CoverCategory", "make", "bodytype",
+    "LegalType", "AccountType", "TermFrequency",
+]
+# KPI name -> (column, kind)
+KPIS = {
+    "frequency": ("ClaimOccurred", "binary"),
+    "severity": ("ClaimSeverity", "continuous"),
+    "margin": ("Margin", "continuous"),
+}
+RESULTS_DIR = "reports/hypothesis_tests"
+
+
+# ----------------------
+# KPIs and grouped statistics
+# ----------------------
+def add_kpis(df):
+    claims = df["TotalClaims"]
+    return df.assign(
+        ClaimOccurred=(claims > 0).astype(int),
+        ClaimSeverity=claims.where(claims > 0),
+        Margin=df["TotalPremium"] - claims,
+    )
+
+
+def top_groups(df, segment, max_groups, min_group_size):
+    """Most frequent groups of ``segment`` (like the notebook's top zip codes), dropping tiny groups."""
+    counts = df[segment].value_counts()
+    counts = counts[counts >= min_group_size]
+    return counts.index[:max_groups] if max_groups else counts.index
+
+
+def group_statistics(df, segment, groups):
+    """One groupby per segment: n, mean and variance of every KPI per group."""
+    sub = df[df[segment].isin(groups)]
+    columns = [col for col, _ in KPIS.values()]
+    return sub.groupby(segment, observed=True)[columns].agg(["count", "mean", "var"]).reindex(groups)
+
+
+# ----------------------
+# Vectorized tests from sufficient statistics
+# ----------------------
+def chi2_omnibus(n, claims):
+    """k x 2 chi-squared test of independence from group sizes and claim counts."""
+    p = claims.sum() / n.sum()
+    if p in (0, 1) or len(n) < 2:
+        return np.nan, len(n) - 1, np.nan
+    expected = np.stack([n * p, n * (1 - p)])
+    observed = np.stack([claims, n - claims])
+    chi2 = float(((observed - expected) ** 2 / expected).sum())
+    return chi2, len(n) - 1, float(stats.chi2.sf(chi2, len(n) - 1))
+
+
+def chi2_pairwise(n, claims, i, j):
+    """2x2 chi-squared (no continuity correction) for every pair (i, j); equals the squared z of the proportions test."""
+    pooled = (claims[i] + claims[j]) / (n[i] + n[j])
+    se2 = pooled * (1 - pooled) * (1 / n[i] + 1 / n[j])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chi2 = (claims[i] / n[i] - claims[j] / n[j]) ** 2 / se2
+    return chi2, stats.chi2.sf(chi2, 1)
+
+
+def anova_omnibus(n, mean, var):
+    ok = n > 1
+    n, mean, var = n[ok], mean[ok], var[ok]
+    k, total = len(n), n.sum()
+    if k < 2 or total <= k:
+        return np.nan, (k - 1, total - k), np.nan
+    grand = (n * mean).sum() / total
+    between = (n * (mean - grand) ** 2).sum() / (k - 1)
+    within = ((n - 1) * var).sum() / (total - k)
+    f = between / within if within > 0 else np.nan
+    return float(f), (k - 1, int(total - k)), float(stats.f.sf(f, k - 1, total - k))
+
+
+def welch_pairwise(n, mean, var, i, j):
+    se_i, se_j = var[i] / n[i], var[j] / n[j]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (mean[i] - mean[j]) / np.sqrt(se_i + se_j)
+        dof = (se_i + se_j) ** 2 / (se_i ** 2 / (n[i] - 1) + se_j ** 2 / (n[j] - 1))
+    return t, dof, 2 * stats.t.sf(np.abs(t), dof)
+
+
+def mann_whitney(a_sorted, b_sorted):
+    """Two-sided Mann-Whitney U (normal approximation with tie correction) from two sorted arrays."""
+    n1, n2 = len(a_sorted), len(b_sorted)
+    if n1 == 0 or n2 == 0:
+        return np.nan, np.nan
+    below = np.searchsorted(b_sorted, a_sorted, side="left")
+    ties = np.searchsorted(b_sorted, a_sorted, side="right") - below
+    u = float(below.sum() + 0.5 * ties.sum())
+    _, tie_counts = np.unique(np.concatenate([a_sorted, b_sorted]), return_counts=True)
+    n = n1 + n2
+    tie_term = ((tie_counts ** 3 - tie_counts).sum()) / (n * (n - 1))
+    sigma = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return u, np.nan
+    z = (abs(u - n1 * n2 / 2) - 0.5) / sigma
+    return u, float(2 * stats.norm.sf(max(z, 0.0)))
+
+
+# ----------------------
+# Multiple-testing correction
+# ----------------------
+def adjust_pvalues(p, method="fdr_bh"):
+    """Adjusted p-values (NaNs kept) for ``bonferroni``, ``holm`` or ``fdr_bh`` (Benjamini-Hochberg)."""
+    p = np.asarray(p, dtype=float)
+    out = np.full_like(p, np.nan)
+    ok = ~np.isnan(p)
+    m = ok.sum()
+    if m == 0:
+        return out
+    pv = p[ok]
+    if method == "bonferroni":
+        adj = np.minimum(pv * m, 1)
+    elif method == "holm":
+        order = np.argsort(pv)
+        stepped = np.maximum.accumulate(pv[order] * (m - np.arange(m)))
+        adj = np.empty(m)
+        adj[order] = np.minimum(stepped, 1)
+    elif method == "fdr_bh":
+        order = np.argsort(pv)[::-1]
+        stepped = np.minimum.accumulate(pv[order] * m / (m - np.arange(m)))
+        adj = np.empty(m)
+        adj[order] = np.minimum(stepped, 1)
+    else:
+        raise ValueError(f"Unknown correction {method!r}")
+    out[ok] = adj
+    return out
+
+
+# ----------------------
+# Permutation tests
+# ----------------------
+def between_group_ss(values, codes, k):
+    n = np.bincount(codes, minlength=k)
+    sums = np.bincount(codes, weights=values, minlength=k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.nansum(sums ** 2 / n) - values.sum() ** 2 / len(values))
+
+
+def _permutation_worker(values, codes, k, observed, n_perm, seed):
+    rng = np.random.default_rng(seed)
+    hits = 0
+    for _ in range(n_perm):
+        if between_group_ss(values, rng.permutation(codes), k) >= observed:
+            hits += 1
+    return hits
+
+
+def permutation_pvalue(values, codes, k, n_permutations, pool, workers, seed):
+    """P(between-group SS under shuffled labels >= observed), split across ``workers`` processes."""
+    observed = between_group_ss(values, codes, k)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    per_worker = [n_permutations // workers + (w < n_permutations % workers) for w in range(workers)]
+    futures = [pool.submit(_permutation_worker, values, codes, k, observed, n, s)
+               for n, s in zip(per_worker, seeds) if n]
+    hits = sum(f.result() for f in futures)
+    return (hits + 1) / (n_permutations + 1)
+
+
+# ----------------------
+# Study
+# ----------------------
+def test_segment(df, segment, max_groups=20, min_group_size=30, mann_whitney_tests=True):
+    """Omnibus and pairwise tests of every KPI across the groups of one segment column."""
+    groups = top_groups(df, segment, max_groups, min_group_size)
+    if len(groups) < 2:
+        return [], []
+    st = group_statistics(df, segment, groups)
+    i, j = np.triu_indices(len(groups), 1)
+    labels = np.asarray(groups, dtype=object).astype(str)
+    omnibus, pairwise = [], []
+
+    for kpi, (col, kind) in KPIS.items():
+        n = st[(col, "count")].to_numpy(dtype=float)
+        mean = st[(col, "mean")].to_numpy(dtype=float)
+        var = st[(col, "var")].to_numpy(dtype=float)
+        base = {"segment": segment, "kpi": kpi}
+
+        if kind == "binary":
+            claims = mean * n
+            chi2, dof, p = chi2_omnibus(n, claims)
+            omnibus.append({**base, "test": "chi2", "statistic": chi2, "dof": dof, "p_value": p,
+                            "n_groups": len(groups), "n": int(n.sum())})
+            stat, pvals = chi2_pairwise(n, claims, i, j)
+            pairwise.append(pd.DataFrame({**base, "test": "chi2", "group_a": labels[i], "group_b": labels[j],
+                                          "n_a": n[i], "n_b": n[j], "value_a": mean[i], "value_b": mean[j],
+                                          "statistic": stat, "dof": 1.0, "p_value": pvals}))
+            continue
+
+        f, dof, p = anova_omnibus(n, mean, var)
+        omnibus.append({**base, "test": "anova", "statistic": f, "dof": dof, "p_value": p,
+                        "n_groups": len(groups), "n": int(n.sum())})
+        t, t_dof, pvals = welch_pairwise(n, mean, var, i, j)
+        pairwise.append(pd.DataFrame({**base, "test": "welch_t", "group_a": labels[i], "group_b": labels[j],
+                                      "n_a": n[i], "n_b": n[j], "value_a": mean[i], "value_b": mean[j],
+                                      "statistic": t, "dof": t_dof, "p_value": pvals}))
+        if mann_whitney_tests:
+            # Sort every group's values once; each pair then only needs binary searches
+            values = df.loc[df[segment].isin(groups), [segment, col]].dropna()
+            sorted_values = {g: np.sort(v.to_numpy(dtype=float))
+                             for g, v in values.groupby(segment, observed=True)[col]}
+            empty = np.empty(0)
+            mw = [mann_whitney(sorted_values.get(groups[a], empty), sorted_values.get(groups[b], empty))
+                  for a, b in zip(i, j)]
+            pairwise.append(pd.DataFrame({**base, "test": "mann_whitney", "group_a": labels[i], "group_b": labels[j],
+                                          "n_a": n[i], "n_b": n[j], "value_a": mean[i], "value_b": mean[j],
+                                          "statistic": [u for u, _ in mw], "dof": np.nan,
+                                          "p_value": [p for _, p in mw]}))
+    return omnibus, pairwise
+
+
+def run_segmentation_study(df, segments=None, max_groups=20, min_group_size=30, correction="fdr_bh",
+                           alpha=0.05, n_permutations=0, workers=None, mann_whitney_tests=True, seed=42):
+    """
+    Run every KPI test for every segment in ``segments`` (default ``DEFAULT_SEGMENTS`` present in ``df``).
+
+    Returns ``(omnibus, pairwise)`` DataFrames with raw and corrected p-values and a ``reject`` flag at
+    ``alpha``; the correction covers all tests of each table. With ``n_permutations`` > 0 the omnibus
+    table also gets a permutation p-value per segment and KPI, computed by ``workers`` processes.
+    """
+    start = time.perf_counter()
+    df = add_kpis(df)
+    segments = [s for s in (segments or DEFAULT_SEGMENTS) if s in df.columns]
+
+    omnibus, pairwise = [], []
+    for segment in segments:
+        o, p = test_segment(df, segment, max_groups, min_group_size, mann_whitney_tests)
+        omnibus += o
+        pairwise += p
+    omnibus = pd.DataFrame(omnibus)
+    pairwise = pd.concat(pairwise, ignore_index=True) if pairwise else pd.DataFrame()
+    logging.info(f"{len(omnibus)} omnibus and {len(pairwise)} pairwise tests over {len(segments)} segments "
+                 f"in {time.perf_counter() - start:.1f}s")
+
+    if n_permutations and len(omnibus):
+        t0 = time.perf_counter()
+        workers = workers or os.cpu_count() or 1
+        perm_p = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for k, row in enumerate(omnibus.itertuples()):
+                col = KPIS[row.kpi][0]
+                groups = top_groups(df, row.segment, max_groups, min_group_size)
+                sub = df.loc[df[row.segment].isin(groups), [row.segment, col]].dropna()
+                codes = pd.Categorical(sub[row.segment], categories=groups).codes
+                perm_p.append(permutation_pvalue(sub[col].to_numpy(dtype=float), codes, len(groups),
+                                                 n_permutations, pool, workers, seed + k))
+        omnibus["permutation_p_value"] = perm_p
+        logging.info(f"Permutation tests ({n_permutations} per test, {workers} workers) "
+                     f"in {time.perf_counter() - t0:.1f}s")
+
+    for table in (omnibus, pairwise):
+        if len(table):
+            table["p_adjusted"] = adjust_pvalues(table["p_value"], correction)
+            table["reject"] = table["p_adjusted"] < alpha
+    return omnibus, pairwise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Segmentation hypothesis tests for every segment column")
+    parser.add_argument("--data", default="data/cleaned_machineLearningRating.csv")
+    parser.add_argument("--segments", nargs="+", default=None)
+    parser.add_argument("--max-groups", type=int, default=20,
+                        help="Most frequent groups tested per segment (0 for all)")
+    parser.add_argument("--min-group-size", type=int, default=30)
+    parser.add_argument("--correction", choices=["fdr_bh", "holm", "bonferroni"], default="fdr_bh")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--permutations", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-mann-whitney", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    segments = args.segments or DEFAULT_SEGMENTS
+    header = pd.read_csv(args.data, nrows=0).columns
+    usecols = [c for c in segments if c in header] + ["TotalClaims", "TotalPremium"]
+    df = pd.read_csv(args.data, usecols=usecols, low_memory=False)
+    omnibus, pairwise = run_segmentation_study(
+        df, segments, args.max_groups, args.min_group_size, args.correction, args.alpha,
+        args.permutations, args.workers, not args.no_mann_whitney, args.seed,
+    )
+    os.makedirs(args.out, exist_ok=True)
+    omnibus.to_csv(os.path.join(args.out, "omnibus_tests.csv"), index=False)
+    pairwise.to_csv(os.path.join(args.out, "pairwise_tests.csv"), index=False)
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(omnibus.to_string())
+    logging.info(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Parallel model selection with cached, memory-mapped design matrices.
+
+For every fold the ColumnTransformer used in ``notebooks/modeling.ipynb`` (StandardScaler on numeric
+columns, OneHotEncoder on the rest) is fitted once, and the encoded train/validation matrices are saved
+as ``.npy`` files under ``cache_dir``. Candidates then only open those files with ``mmap_mode="r"``, so
+no candidate, fold or parameter set re-encodes the data and the pool workers share the OS page cache
+instead of receiving pickled copies.
+
+Candidates (estimator x parameter grid) are evaluated by successive halving: every round trains on a
+growing number of training rows and keeps the best ``1 / factor`` of the candidates, until one is left
+or the full training set is used. The result is a leaderboard with mean/std validation score and
+fit/score timing per candidate.
+
+Usage (from the repo root):
+    python -m src.model_selection --model severity --folds 3 --workers 4
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.metrics import mean_squared_error, r2_score, roc_auc_score
+from sklearn.model_selection import KFold, StratifiedKFold
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.chunked_training import MODEL_SPECS
+from src.preprocess import PROCESSED_DATA_PATH
+
+try:
+    from xgboost import XGBClassifier, XGBRegressor
+except ImportError:  # optional, as in the notebooks' environment
+    XGBClassifier = XGBRegressor = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+CACHE_DIR = "models/selection_cache"
+RESULTS_DIR = "models/selection_results"
+TOP_K = 15  # most frequent categories kept per categorical column, as in the claim notebook
+
+# ----------------------
+# Candidate estimators and parameter grids
+# ----------------------
+REGRESSORS = {
+    "linear_regression": (LinearRegression, {}),
+    "decision_tree": (DecisionTreeRegressor, {"max_depth": [4, 8, 16], "min_samples_leaf": [1, 10]}),
+    "random_forest": (RandomForestRegressor, {"n_estimators": [100], "max_depth": [8, 16, None],
+                                              "min_samples_leaf": [1, 5]}),
+    "xgboost": (XGBRegressor, {"n_estimators": [200], "max_depth": [4, 6], "learning_rate": [0.05, 0.1]}),
+}
+CLASSIFIERS = {
+    "logistic_regression": (LogisticRegression, {"C": [0.1, 1.0, 10.0], "max_iter": [1000],
+                                                 "class_weight": ["balanced"]}),
+    "decision_tree": (DecisionTreeClassifier, {"max_depth": [4, 8, 16], "class_weight": ["balanced"]}),
+    "random_forest": (RandomForestClassifier, {"n_estimators": [100], "max_depth": [8, 16, None],
+                                               "class_weight": ["balanced"]}),
+    "xgboost": (XGBClassifier, {"n_estimators": [200], "max_depth": [4, 6], "learning_rate": [0.05, 0.1]}),
+}
+# Estimators that accept random_state / n_jobs
+SEEDED = tuple(c for c in (DecisionTreeRegressor, DecisionTreeClassifier, RandomForestRegressor,
+                           RandomForestClassifier, LogisticRegression, XGBRegressor, XGBClassifier) if c)
+THREADED = tuple(c for c in (RandomForestRegressor, RandomForestClassifier, XGBRegressor, XGBClassifier) if c)
+
+
+def candidate_grid(task, estimators=None):
+    registry = CLASSIFIERS if task == "classification" else REGRESSORS
+    candidates = []
+    for name, (cls, grid) in registry.items():
+        if cls is None or (estimators and name not in estimators):
+            continue
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            candidates.append({"estimator": name, "params": dict(zip(keys, values))})
+    return candidates
+
+
+def build_estimator(task, name, params, random_state):
+    cls = (CLASSIFIERS if task == "classification" else REGRESSORS)[name][0]
+    params = dict(params)
+    if cls in SEEDED:
+        params.setdefault("random_state", random_state)
+    if cls in THREADED:
+        # One process per task already; nested threads would oversubscribe the pool
+        params["n_jobs"] = 1
+    return cls(**params)
+
+
+# ----------------------
+# Fold cache
+# ----------------------
+def load_training_frame(data_path, spec, sample_frac=1.0, random_state=42):
+    df = pd.read_csv(data_path, low_memory=False)
+    if 0 < sample_frac < 1.0:
+        df = df.sample(frac=sample_frac, random_state=random_state)
+    if spec["rows"] is not None:
+        df = df[spec["rows"](df)]
+    df = df[df[spec["target"]].notna()]
+    y = df[spec["target"]].to_numpy(dtype=np.float64)
+    if spec["task"] == "classification":
+        y = (y > 0).astype(np.int64)
+    X = df.drop(columns=[c for c in spec["drop"] + [spec["target"]] if c in df.columns])
+    return X.reset_index(drop=True), y
+
+
+def make_preprocessor(X):
+    numeric_cols = X.select_dtypes(include=[np.number]).columns.tolist()
+    cat_cols = X.select_dtypes(include=["object", "bool", "category", "string"]).columns.tolist()
+    return ColumnTransformer([
+        ("num", StandardScaler(), numeric_cols),
+        ("cat", OneHotEncoder(handle_unknown="infrequent_if_exist", max_categories=TOP_K,
+                              sparse_output=False, dtype=np.float32), cat_cols),
+    ]), numeric_cols, cat_cols
+
+
+def cache_key(data_path, model, folds, sample_frac, random_state):
+    st = os.stat(data_path)
+    raw = json.dumps([os.path.abspath(data_path), st.st_mtime_ns, st.st_size, model, folds,
+                      sample_frac, random_state, TOP_K])
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def build_fold_cache(data_path, model, folds=3, sample_frac=1.0, random_state=42, cache_dir=CACHE_DIR):
+    """
+    Encode each fold once and save ``X_train``/``y_train``/``X_val``/``y_val`` as ``.npy`` files.
+
+    Training rows are shuffled before saving, so the first ``n`` rows are a random subset (used by the
+    halving rounds). Returns ``(fold_dirs, encode_seconds)``; an existing cache for the same data file,
+    model and settings is reused.
+    """
+    spec = MODEL_SPECS[model]
+    root = os.path.join(cache_dir, f"{model}_{cache_key(data_path, model, folds, sample_frac, random_state)}")
+    fold_dirs = [os.path.join(root, f"fold{i}") for i in range(folds)]
+    meta_path = os.path.join(root, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        logging.info(f"Reusing encoded folds in {root}")
+        return fold_dirs, meta["encode_seconds"]
+
+    X, y = load_training_frame(data_path, spec, sample_frac, random_state)
+    numeric = X.select_dtypes(include=[np.number]).columns
+    X[numeric] = X[numeric].fillna(0)
+    rng = np.random.default_rng(random_state)
+    if spec["task"] == "classification":
+        splitter = StratifiedKFold(folds, shuffle=True, random_state=random_state).split(X, y)
+    else:
+        splitter = KFold(folds, shuffle=True, random_state=random_state).split(X)
+
+    encode_seconds = []
+    for fold_dir, (train_idx, val_idx) in zip(fold_dirs, splitter):
+        t0 = time.perf_counter()
+        train_idx = rng.permutation(train_idx)
+        preprocessor, _, cat_cols = make_preprocessor(X)
+        X_train = X.iloc[train_idx]
+        X_val = X.iloc[val_idx]
+        X_train[cat_cols] = X_train[cat_cols].astype(str)
+        X_val[cat_cols] = X_val[cat_cols].astype(str)
+        os.makedirs(fold_dir, exist_ok=True)
+        np.save(os.path.join(fold_dir, "X_train.npy"), preprocessor.fit_transform(X_train).astype(np.float32))
+        np.save(os.path.join(fold_dir, "X_val.npy"), preprocessor.transform(X_val).astype(np.float32))
+        np.save(os.path.join(fold_dir, "y_train.npy"), y[train_idx])
+        np.save(os.path.join(fold_dir, "y_val.npy"), y[val_idx])
+        encode_seconds.append(time.perf_counter() - t0)
+
+    with open(meta_path, "w") as f:
+        json.dump({"model": model, "rows": len(y), "folds": folds, "encode_seconds": encode_seconds}, f)
+    logging.info(f"Encoded {folds} folds of {len(y)} rows into {root} in {sum(encode_seconds):.1f}s")
+    return fold_dirs, encode_seconds
+
+
+# ----------------------
+# Worker task
+# ----------------------
+def evaluate_candidate(task, candidate, fold_dir, n_rows, random_state):
+    """Fit one candidate on the first ``n_rows`` of a cached fold and score it on the validation split."""
+    X_train = np.load(os.path.join(fold_dir, "X_train.npy"), mmap_mode="r")[:n_rows]
+    y_train = np.load(os.path.join(fold_dir, "y_train.npy"), mmap_mode="r")[:n_rows]
+    X_val = np.load(os.path.join(fold_dir, "X_val.npy"), mmap_mode="r")
+    y_val = np.load(os.path.join(fold_dir, "y_val.npy"), mmap_mode="r")
+    estimator = build_estimator(task, candidate["estimator"], candidate["params"], random_state)
+
+    t0 = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    if task == "classification":
+        if len(np.unique(y_train)) < 2:
+            score, extra = float("nan"), {}
+        else:
+            proba = estimator.predict_proba(X_val)[:, 1]
+            score, extra = roc_auc_score(y_val, proba), {}
+    else:
+        pred = estimator.predict(X_val)
+        rmse = float(np.sqrt(mean_squared_error(y_val, pred)))
+        # Higher is better for every score so candidates rank the same way for both tasks
+        score, extra = -rmse, {"rmse": rmse, "r2": float(r2_score(y_val, pred))}
+    score_seconds = time.perf_counter() - t0
+    return {"score": float(score), "fit_seconds": fit_seconds, "score_seconds": score_seconds, **extra}
+
+
+# ----------------------
+# Successive halving
+# ----------------------
+def successive_halving(task, candidates, fold_dirs, n_train, workers=None, factor=3,
+                       min_rows=2000, random_state=42):
+    """Evaluate ``candidates`` on all folds, growing rows by ``factor`` and keeping the top 1/factor each round."""
+    n_rounds, n_alive, rows = 1, len(candidates), min_rows
+    while n_alive > 1 and rows < n_train:
+        n_alive, rows, n_rounds = max(1, n_alive // factor), rows * factor, n_rounds + 1
+    records = {i: {**c, "rounds": 0, "rows": 0, "fit_seconds": 0.0, "score_seconds": 0.0, "folds": []}
+               for i, c in enumerate(candidates)}
+    alive = list(records)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rnd in range(n_rounds):
+            last = rnd == n_rounds - 1
+            n_rows = n_train if last else min(n_train, min_rows * factor ** rnd)
+            t0 = time.perf_counter()
+            futures = {
+                (i, f): pool.submit(evaluate_candidate, task, records[i], fold_dir, n_rows, random_state)
+                for i in alive for f, fold_dir in enumerate(fold_dirs)
+            }
+            for i in alive:
+                folds = [futures[(i, f)].result() for f in range(len(fold_dirs))]
+                rec = records[i]
+                rec.update(rounds=rnd + 1, rows=n_rows, folds=folds,
+                           score=float(np.nanmean([r["score"] for r in folds])),
+                           score_std=float(np.nanstd([r["score"] for r in folds])))
+                rec["fit_seconds"] += sum(r["fit_seconds"] for r in folds)
+                rec["score_seconds"] += sum(r["score_seconds"] for r in folds)
+            logging.info(f"Round {rnd + 1}/{n_rounds}: {len(alive)} candidates on {n_rows} rows "
+                         f"in {time.perf_counter() - t0:.1f}s")
+            if not last:
+                alive.sort(key=lambda i: np.nan_to_num(records[i]["score"], nan=-np.inf), reverse=True)
+                alive = alive[:max(1, len(alive) // factor)]
+    return list(records.values())
+
+
+def leaderboard(records, task):
+    rows = []
+    for rec in records:
+        row = {
+            "estimator": rec["estimator"],
+            "params": json.dumps(rec["params"], sort_keys=True),
+            "rounds": rec["rounds"],
+            "rows": rec["rows"],
+            "score": rec.get("score"),
+            "score_std": rec.get("score_std"),
+            "fit_seconds": round(rec["fit_seconds"], 3),
+            "score_seconds": round(rec["score_seconds"], 3),
+        }
+        if task == "regression":
+            row["rmse"] = float(np.mean([f["rmse"] for f in rec["folds"]]))
+            row["r2"] = float(np.mean([f["r2"] for f in rec["folds"]]))
+        rows.append(row)
+    board = pd.DataFrame(rows)
+    # Candidates that reached later rounds rank above those stopped early, then by score
+    return board.sort_values(["rounds", "score"], ascending=False, na_position="last").reset_index(drop=True)
+
+
+def run_model_selection(model, data_path=PROCESSED_DATA_PATH, folds=3, workers=None, factor=3, min_rows=2000,
+                        estimators=None, sample_frac=1.0, random_state=42, cache_dir=CACHE_DIR,
+                        results_dir=RESULTS_DIR):
+    task = MODEL_SPECS[model]["task"]
+    start = time.perf_counter()
+    fold_dirs, encode_seconds = build_fold_cache(data_path, model, folds, sample_frac, random_state, cache_dir)
+    n_train = min(np.load(os.path.join(d, "y_train.npy"), mmap_mode="r").shape[0] for d in fold_dirs)
+    candidates = candidate_grid(task, estimators)
+    logging.info(f"{model}: {len(candidates)} candidates x {folds} folds, {n_train} training rows per fold")
+
+    records = successive_halving(task, candidates, fold_dirs, n_train, workers, factor, min_rows, random_state)
+    board = leaderboard(records, task)
+
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    board_path = os.path.join(results_dir, f"{model}_leaderboard_{stamp}.csv")
+    board.to_csv(board_path, index=False)
+    with open(os.path.join(results_dir, f"{model}_leaderboard_{stamp}.json"), "w") as f:
+        json.dump({"model": model, "task": task, "folds": folds, "factor": factor, "min_rows": min_rows,
+                   "encode_seconds": encode_seconds, "total_seconds": round(time.perf_counter() - start, 3),
+                   "leaderboard": board.to_dict(orient="records")}, f, indent=2)
+    logging.info(f"Leaderboard saved to {board_path}")
+    return board
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel successive-halving model selection on cached folds")
+    parser.add_argument("--model", choices=list(MODEL_SPECS), required=True)
+    parser.add_argument("--data", default=PROCESSED_DATA_PATH)
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--factor", type=int, default=3)
+    parser.add_argument("--min-rows", type=int, default=2000)
+    parser.add_argument("--estimators", nargs="+", default=None,
+                        help="Restrict to these candidate names, e.g. decision_tree random_forest")
+    parser.add_argument("--sample-frac", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--out", default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+    board = run_model_selection(args.model, args.data, args.folds, args.workers, args.factor, args.min_rows,
+                                args.estimators, args.sample_frac, args.seed, args.cache_dir, args.out)
+    with pd.option_context("display.max_colwidth", 80, "display.width", 200):
+        print(board.to_string())
+
+
+if __name__ == "__main__":
+    main()
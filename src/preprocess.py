@@ -1,9 +1,13 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
 import logging
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.data_quality import QUALITY_BASELINE_PATH, QUALITY_REPORT_PATH, load_report, profile_file, save_report
+
 # ----------------------
 # Logging setup
 # ----------------------
@@ -30,9 +34,15 @@ def load_data(file_path: str) -> pd.DataFrame:
 # ----------------------
 # Clean and preprocess
 # ----------------------
-def clean_data(df: pd.DataFrame) -> pd.DataFrame:
+def clean_data(df: pd.DataFrame, quality_report: dict = None) -> pd.DataFrame:
     # Drop high-missing columns
     drop_cols = ['CrossBorder', 'Citizenship', 'MaritalStatus', 'Language', 'CustomValueEstimate', 'NumberOfVehiclesInFleet']
+    if quality_report is not None and quality_report.get("drift_checked"):
+        # Plus any column the data-quality profiler found mostly missing or placeholder in this extract,
+        # trusted only once the extract passed the drift check against a baseline
+        drop_cols += [col for col in quality_report["recommended_drops"] if col not in drop_cols]
+    elif quality_report is not None and quality_report["recommended_drops"]:
+        logging.warning(f"Not dropping {quality_report['recommended_drops']}: no baseline drift check was run")
     df.drop(columns=[col for col in drop_cols if col in df.columns], inplace=True)
     logging.info(f"Dropped columns due to high missing values or low utility: {drop_cols}")
 
@@ -225,9 +235,14 @@ def save_data(df: pd.DataFrame, file_path: str):
 # ----------------------
 # Main
 # ----------------------
-def run_preprocessing():
+def run_preprocessing(quality_baseline: dict = None):
+    # Profile the raw extract first; raises QualityDriftError if it drifted from the baseline report
+    if quality_baseline is None and os.path.exists(QUALITY_BASELINE_PATH):
+        quality_baseline = load_report(QUALITY_BASELINE_PATH)
+    report = profile_file(RAW_DATA_PATH, baseline=quality_baseline)
+    save_report(report, QUALITY_REPORT_PATH)
     df = load_data(RAW_DATA_PATH)
-    df = clean_data(df)
+    df = clean_data(df, quality_report=report)
     df = feature_engineering(df)
     save_data(df, PROCESSED_DATA_PATH)
 
@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+from benchmarks.synthetic import make_policy_rows
+from src.chunked_training import ChunkedModel, train_chunked
+
+
+@pytest.fixture(scope="module")
+def processed_csv(tmp_path_factory):
+    # Claim rate depends on vehicle type (1% vs 9%), so calibration is checked against a real signal
+    df = make_policy_rows(20_000, seed=3)
+    rng = np.random.default_rng(3)
+    rate = np.where(df["VehicleType"] == "bus", 0.09, 0.01)
+    df["TotalClaims"] = np.where(rng.random(len(df)) < rate, 5000.0, 0.0)
+    path = tmp_path_factory.mktemp("data") / "processed.csv"
+    df.to_csv(path, index=False)
+    return str(path), df
+
+
+def binary_log_loss(y, p):
+    p = np.clip(p, 1e-15, 1 - 1e-15)
+    return float(-np.mean(np.where(y, np.log(p), np.log(1 - p))))
+
+
+@pytest.mark.parametrize("class_weight", [None, "balanced"])
+def test_claim_probabilities_are_calibrated(processed_csv, tmp_path, class_weight):
+    path, df = processed_csv
+    manifest = train_chunked(path, str(tmp_path), models=("claim",), chunksize=4000, epochs=8,
+                             class_weight=class_weight)
+    metrics = manifest["models"]["claim"]["metrics"]
+    model = joblib.load(manifest["models"]["claim"]["path"])
+
+    proba = model.predict_proba(df.sample(5000, random_state=0))[:, 1]
+    assert np.mean((proba < 1e-6) | (proba > 1 - 1e-6)) == 0
+    assert np.abs(model.estimator.coef_).max() < 10
+    assert abs(metrics["mean_proba"] - metrics["positive_rate"]) < 0.01
+    assert metrics["calibration_error"] < 0.02
+
+    # Better than always predicting the hold-out claim rate
+    base_rate = metrics["positive_rate"]
+    holdout_y = np.r_[np.ones(round(base_rate * 1000)), np.zeros(1000 - round(base_rate * 1000))]
+    assert metrics["log_loss"] < binary_log_loss(holdout_y, np.full(1000, base_rate))
+
+    bus = df["VehicleType"] == "bus"
+    assert model.predict_proba(df[bus].head(500))[:, 1].mean() == pytest.approx(0.09, abs=0.03)
+    assert model.predict_proba(df[~bus].head(500))[:, 1].mean() == pytest.approx(0.01, abs=0.01)
+
+
+def test_cli_artifacts_load_outside_main(processed_csv, tmp_path):
+    path, _ = processed_csv
+    subprocess.run([sys.executable, "-m", "src.chunked_training", "--data", path, "--out", str(tmp_path),
+                    "--models", "claim", "--chunksize", "5000", "--epochs", "1"],
+                   cwd=REPO_ROOT, check=True, capture_output=True)
+    manifest_path = next(p for p in tmp_path.iterdir() if p.name.startswith("training_manifest_"))
+    artifact = json.loads(manifest_path.read_text())["models"]["claim"]["path"]
+
+    with open(artifact, "rb") as f:
+        assert b"__main__" not in f.read()
+    assert isinstance(joblib.load(artifact), ChunkedModel)
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.data_quality import QualityDriftError, profile_file
+
+
+def write_extract(path, n=120_000, seed=0):
+    # Like the raw extract: Bank is empty for the older policies at the top of the file, so the first
+    # chunks are far more "missing" than the whole file
+    rng = np.random.default_rng(seed)
+    bank = np.where(np.arange(n) < 0.8 * n, "", rng.choice(["ABSA Bank", "First National Bank"], n))
+    df = pd.DataFrame({
+        "UnderwrittenCoverID": np.arange(n),
+        "Bank": bank,
+        "Province": rng.choice(["Gauteng", "Western Cape"], n),
+        "TotalPremium": rng.gamma(2.0, 50.0, n).round(2),
+    })
+    df.to_csv(path, sep="|", index=False)
+    return df
+
+
+def test_unchanged_extract_passes_its_own_baseline(tmp_path):
+    path = tmp_path / "extract.txt"
+    write_extract(path)
+    baseline = profile_file(str(path), chunksize=20_000)
+    assert baseline["columns"]["Bank"]["missing_percent"] == pytest.approx(80.0)
+
+    report = profile_file(str(path), chunksize=20_000, baseline=baseline)
+    assert report["drift_checked"]
+    assert report["columns"] == baseline["columns"]
+
+
+def test_new_mixed_types_fail(tmp_path):
+    path = tmp_path / "extract.txt"
+    df = write_extract(path)
+    baseline = profile_file(str(path), chunksize=20_000)
+
+    df["TotalPremium"] = df["TotalPremium"].astype(str)
+    df.loc[10, "TotalPremium"] = "unknown"
+    df.to_csv(path, sep="|", index=False)
+    with pytest.raises(QualityDriftError, match="TotalPremium: now has mixed types"):
+        profile_file(str(path), chunksize=20_000, baseline=baseline)
@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.prediction_cache import PredictionCache, deep_sizeof
+
+
+def test_put_from_replaced_models_is_dropped(tmp_path):
+    artifact = tmp_path / "model.pkl"
+    artifact.write_bytes(b"v1")
+    reloads = []
+    cache = PredictionCache(artifact_paths=[str(artifact)], check_interval=0,
+                            on_artifacts_changed=lambda: reloads.append(artifact.read_bytes()))
+
+    generation = cache.generation  # request starts, computes with the v1 model...
+    artifact.write_bytes(b"v2-model")
+    cache.check_artifacts()        # ...while another request sees the new file and reloads
+    cache.put(("claim", "k"), 0.5, generation)
+
+    assert reloads == [b"v2-model"]
+    assert cache.get(("claim", "k")) is None
+    assert cache.stats()["stale_puts"] == 1
+
+    cache.put(("claim", "k"), 0.7, cache.generation)
+    assert cache.get(("claim", "k")) == 0.7
+
+
+def test_failed_reload_is_retried(tmp_path):
+    artifact = tmp_path / "model.pkl"
+    artifact.write_bytes(b"v1")
+    attempts = []
+
+    def reload():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise EOFError("half-written pickle")
+
+    cache = PredictionCache(artifact_paths=[str(artifact)], check_interval=0, on_artifacts_changed=reload)
+    artifact.write_bytes(b"v2-model")
+    cache.check_artifacts()
+    cache.check_artifacts()
+    assert len(attempts) == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_deep_size_bounds_nested_values():
+    value = {"method": "linear", "contributions": {f"feature_{i}": float(i) for i in range(40)}}
+    shallow = PredictionCache(max_bytes=100_000)
+    deep = PredictionCache(max_bytes=100_000, size_fn=deep_sizeof)
+    for i in range(200):
+        shallow.put(("claim", str(i)), dict(value))
+        deep.put(("claim", str(i)), {**value, "contributions": dict(value["contributions"])})
+
+    assert deep_sizeof(value) > 5 * sys.getsizeof(value)
+    assert deep.stats()["entries"] < shallow.stats()["entries"]
+    assert deep.stats()["bytes"] <= 100_000
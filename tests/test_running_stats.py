@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.running_stats import DatasetSummary, QuantileSketch
+from benchmarks.synthetic import make_policy_rows
+
+
+@pytest.fixture(scope="module")
+def policies():
+    df = make_policy_rows(50_000, seed=1)
+    df.loc[df.sample(frac=0.1, random_state=1).index, "CapitalOutstanding"] = np.nan
+    return df
+
+
+def test_eda_preview_matches_describe(policies):
+    numeric = DatasetSummary.from_frame(policies, chunksize=7_000).to_eda_preview()["numeric_summary"]
+    expected = policies.describe()
+    assert sorted(numeric) == sorted(expected.columns)
+    for col in expected.columns:
+        for stat, value in expected[col].items():
+            assert numeric[col][stat] == pytest.approx(value, rel=1e-9, abs=1e-9), (col, stat)
+
+
+def test_merged_summaries_bound_rank_error(policies):
+    # Built per chunk and merged, as separate workers would: quantiles come from the sketch
+    summary = DatasetSummary()
+    for start in range(0, len(policies), 7_000):
+        part = DatasetSummary()
+        part.update(policies.iloc[start:start + 7_000])
+        summary.merge(part)
+    numeric = summary.to_eda_preview()["numeric_summary"]
+    for col in ["RegistrationYear", "kilowatts", "SumInsured", "TotalPremium", "CapitalOutstanding"]:
+        values = np.sort(policies[col].dropna().to_numpy())
+        for q in (0.25, 0.5, 0.75):
+            estimate = numeric[col][f"{int(q * 100)}%"]
+            lo = np.searchsorted(values, estimate, side="left") / len(values)
+            hi = np.searchsorted(values, estimate, side="right") / len(values)
+            assert lo - 0.02 <= q <= hi + 0.02, (col, q, estimate)
+
+
+def test_sketch_is_exact_below_k():
+    values = np.array([1987.0, 1994, 2001, 2008, 2015, 2003, 1999])
+    sketch = QuantileSketch(k=200)
+    sketch.update(values)
+    for q in (0.25, 0.5, 0.75):
+        assert sketch.quantile(q) == pd.Series(values).quantile(q)
@@ -1,13 +1,221 @@
+"""
+Schema-locked encoding of model inputs (replaces ``pd.get_dummies`` in ``prepare_features``).
+
+Fit the encoder once on the training data and save it next to the models:
+    python -m utils.preprocess_input --data data/processed/processed_insurance_data.csv --ignore-other-text
+"""
+import argparse
+import logging
+import os
+import sys
+
+import joblib
+import numpy as np
 import pandas as pd
+from scipy import sparse
+
+ENCODER_PATH = "models/input_encoder.pkl"
+
+# Yes/No flags converted to 1/0
+BOOL_MAPS = {
+    "TrackingDevice": {"Yes": 1, "No": 0},
+    "NewVehicle": {"Yes": 1, "No": 0},
+}
+# One-hot encoded as used in training
+CATEGORICAL_COLS = ["Gender", "Province", "CoverType", "VehicleType"]
+UNKNOWN_CATEGORY = "__unknown__"
+
+
+def is_numeric(series):
+    # Booleans are flags to encode, not numbers to pass through
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+class InputEncoder:
+    """
+    Schema-locked replacement for ``pd.get_dummies``: the category vocabularies and numeric columns
+    are fixed at ``fit`` time, so every batch (or single row) is encoded to the same width and column
+    order. Values not seen during fit go to an explicit ``<col>___unknown__`` column; missing values
+    leave every column of that feature at zero, like ``get_dummies``.
+
+    Numeric columns pass through. Any other column must be listed in ``categorical_cols``, ``bool_maps``
+    or ``ignore_cols``; otherwise ``fit`` and ``transform`` raise ``ValueError`` instead of silently
+    leaving it out.
+    """
+
+    def __init__(self, categorical_cols=CATEGORICAL_COLS, bool_maps=BOOL_MAPS, max_categories=None,
+                 ignore_cols=()):
+        self.categorical_cols = list(categorical_cols)
+        self.bool_maps = dict(bool_maps)
+        # Keep only the most frequent values per column (the rest share the unknown bucket)
+        self.max_categories = max_categories
+        self.ignore_cols = list(ignore_cols)
+
+    def _check_unexpected(self, df):
+        known = set(self.categorical_cols) | set(self.bool_maps) | set(self.ignore_cols)
+        unexpected = [c for c in df.columns if c not in known and not is_numeric(df[c])]
+        if unexpected:
+            raise ValueError(f"Non-numeric columns the encoder would drop: {unexpected}; "
+                             f"add them to categorical_cols, bool_maps or ignore_cols")
+
+    def fit(self, df):
+        self._counts = None
+        return self.partial_fit(df)
+
+    def partial_fit(self, df):
+        """Accumulate category counts from one chunk; the vocabularies cover every chunk seen so far."""
+        if getattr(self, "_counts", None) is None:
+            self._check_unexpected(df)
+            encoded = set(self.categorical_cols) | set(self.bool_maps) | set(self.ignore_cols)
+            self.numeric_cols_ = [c for c in df.select_dtypes(include=[np.number]).columns if c not in encoded]
+            self._counts = {col: {} for col in self.categorical_cols}
+        for col in self.categorical_cols:
+            counts = self._counts[col]
+            for value, c in df[col].dropna().astype(str).value_counts().items():
+                counts[value] = counts.get(value, 0) + int(c)
+
+        self.vocabularies_ = {}
+        for col, counts in self._counts.items():
+            values = list(counts)
+            if self.max_categories is not None and len(values) > self.max_categories:
+                values = sorted(values, key=lambda v: (-counts[v], v))[:self.max_categories]
+            self.vocabularies_[col] = sorted(values)
+        names = self.numeric_cols_ + list(self.bool_maps)
+        self.offsets_ = {}
+        for col, vocab in self.vocabularies_.items():
+            self.offsets_[col] = len(names)
+            names += [f"{col}_{v}" for v in vocab] + [f"{col}_{UNKNOWN_CATEGORY}"]
+        self.feature_names_out_ = names
+        return self
+
+    @property
+    def n_features_(self):
+        return len(self.feature_names_out_)
+
+    def _check_columns(self, df):
+        required = self.numeric_cols_ + list(self.bool_maps) + self.categorical_cols
+        missing = [c for c in required if c not in df.columns]
+        if missing:
+            raise KeyError(f"Input is missing columns the encoder was fitted on: {missing}")
+
+    def _slots(self, df):
+        """(n_rows, n_slots) value and column-index arrays: one slot per numeric/flag column and per categorical."""
+        self._check_columns(df)
+        self._check_unexpected(df)
+        n = len(df)
+        n_dense = len(self.numeric_cols_) + len(self.bool_maps)
+        values = np.empty((n, n_dense + len(self.categorical_cols)), dtype=np.float64)
+        indices = np.empty(values.shape, dtype=np.int32)
+
+        # Numeric and Yes/No columns keep their fixed positions; columns are read, the frame is never copied
+        for j, col in enumerate(self.numeric_cols_):
+            values[:, j] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        for j, (col, mapping) in enumerate(self.bool_maps.items(), start=len(self.numeric_cols_)):
+            values[:, j] = df[col].map(mapping).to_numpy(dtype=np.float64, na_value=np.nan)
+        indices[:, :n_dense] = np.arange(n_dense, dtype=np.int32)
+
+        # Categoricals: code into the fitted vocabulary; -1 (unseen) goes to the unknown bucket
+        for j, col in enumerate(self.categorical_cols, start=n_dense):
+            vocab = self.vocabularies_[col]
+            series = df[col]
+            present = series.notna().to_numpy()
+            codes = pd.Categorical(series.astype(str), categories=vocab).codes.astype(np.int32)
+            codes[codes < 0] = len(vocab)
+            indices[:, j] = self.offsets_[col] + codes
+            values[:, j] = present
+        return values, indices
+
+    def transform(self, df, dense=False):
+        """Encode ``df`` to a CSR matrix (or a preallocated dense array) of width ``n_features_``."""
+        values, indices = self._slots(df)
+        n, k = values.shape
+        if dense:
+            out = np.zeros((n, self.n_features_), dtype=np.float64)
+            np.put_along_axis(out, indices, values, axis=1)
+            return out
+        # Every row has exactly k slots, so the CSR structure can be written directly
+        matrix = sparse.csr_matrix(
+            (values.ravel(), indices.ravel(), np.arange(0, n * k + 1, k)),
+            shape=(n, self.n_features_),
+        )
+        matrix.eliminate_zeros()
+        return matrix
+
+    def save(self, path=ENCODER_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path=ENCODER_PATH):
+        return joblib.load(path)
+
+
+def fit_encoder(df, path=ENCODER_PATH, **params):
+    """Fit the encoder on the training frame and save it next to the models."""
+    encoder = InputEncoder(**params).fit(df)
+    encoder.save(path)
+    return encoder
+
+
+def fit_encoder_from_file(data_path, path=ENCODER_PATH, chunksize=200_000, ignore_other_text=False, **params):
+    """Fit the encoder on a CSV chunk by chunk (vocabularies cover the whole file) and save it."""
+    encoder = None
+    for chunk in pd.read_csv(data_path, chunksize=chunksize, low_memory=False):
+        if encoder is None:
+            if ignore_other_text:
+                known = set(params.get("categorical_cols", CATEGORICAL_COLS)) | set(params.get("bool_maps", BOOL_MAPS))
+                other = [c for c in chunk.columns if c not in known and not is_numeric(chunk[c])]
+                logging.info(f"Ignoring non-numeric columns not encoded: {other}")
+                params["ignore_cols"] = list(params.get("ignore_cols", [])) + other
+            encoder = InputEncoder(**params)
+        encoder.partial_fit(chunk)
+    encoder.save(path)
+    logging.info(f"Encoder with {encoder.n_features_} features saved to {path}")
+    return encoder
+
+
+_encoder = None
+
+
+def prepare_features(df, encoder=None, dense=False):
+    """
+    Encode model inputs with the fitted, saved encoder (loaded once from ``ENCODER_PATH`` by default).
+
+    Returns a ``scipy.sparse`` CSR matrix (not a DataFrame), or a dense ``numpy`` array with
+    ``dense=True``; column names are ``encoder.feature_names_out_``. Raises ``ValueError`` for
+    non-numeric columns the encoder was not fitted to encode or ignore.
+    """
+    global _encoder
+    if encoder is None:
+        if _encoder is None:
+            if not os.path.exists(ENCODER_PATH):
+                raise FileNotFoundError(f"No fitted encoder at {ENCODER_PATH}; run "
+                                        f"`python -m utils.preprocess_input --data <training csv>` first")
+            _encoder = InputEncoder.load()
+        encoder = _encoder
+    return encoder.transform(df, dense=dense)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit and save the input encoder used by prepare_features")
+    parser.add_argument("--data", default="data/processed/processed_insurance_data.csv")
+    parser.add_argument("--out", default=ENCODER_PATH)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--categorical", nargs="+", default=CATEGORICAL_COLS, help="Columns to one-hot encode")
+    parser.add_argument("--ignore", nargs="*", default=[], help="Non-numeric columns to leave out")
+    parser.add_argument("--ignore-other-text", action="store_true",
+                        help="Leave out every non-numeric column that is not encoded (listed in the log)")
+    parser.add_argument("--max-categories", type=int, default=None)
+    args = parser.parse_args(argv)
 
-def prepare_features(df):
-    df = df.copy()
-    # Convert booleans
-    df["TrackingDevice"] = df["TrackingDevice"].map({"Yes": 1, "No": 0})
-    df["NewVehicle"] = df["NewVehicle"].map({"Yes": 1, "No": 0})
+    # Import by module path so the pickled encoder refers to utils.preprocess_input, not __main__
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.preprocess_input import fit_encoder_from_file
+    fit_encoder_from_file(args.data, args.out, args.chunksize, args.ignore_other_text,
+                          categorical_cols=args.categorical, ignore_cols=args.ignore,
+                          max_categories=args.max_categories)
 
-    # One-hot or label encode as used in training
-    categorical_cols = ["Gender", "Province", "CoverType", "VehicleType"]
-    df = pd.get_dummies(df, columns=categorical_cols)
 
-    return df
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()